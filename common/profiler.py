@@ -0,0 +1,126 @@
+import csv
+import json
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+
+import numpy as np
+
+# Every demo reports the same stages, in this order, so sessions can be compared; unused stages stay at zero.
+STAGES = ('update', 'spawn', 'cull', 'buffer_build', 'draw', 'swap', 'texture_upload')
+SCHEMA_VERSION = 1
+HISTORY_FRAMES = 600
+# Rows kept for export, the last half hour at 60 fps; older frames are dropped so long runs stay bounded.
+SESSION_FRAMES = 108000
+PERCENTILES = (50, 95, 99)
+# The overlay text is rebuilt this often rather than sorting the history every frame.
+HUD_REFRESH_FRAMES = 30
+
+_UNTIMED = nullcontext()
+
+
+class StageTimer:
+    def __init__(self, totals, index):
+        self.totals = totals
+        self.index = index
+        self.start = 0.
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.totals[self.index] += perf_counter() - self.start
+        return False
+
+
+class FrameProfiler:
+    # Stage times are inclusive and summed over the frame; a frame ends at end_frame(), normally after the swap.
+    # The last HISTORY_FRAMES frames feed the overlay, the last session_frames feed export().
+    def __init__(self, demo, enabled=False, history=HISTORY_FRAMES, session_frames=SESSION_FRAMES):
+        self.demo = demo
+        self.enabled = enabled
+        self.totals = np.zeros(len(STAGES))
+        self.timers = {name: StageTimer(self.totals, index) for index, name in enumerate(STAGES)}
+        # Column 0 is the whole frame, the rest follow STAGES.
+        self.history = np.zeros((history, len(STAGES) + 1))
+        self.frame = 0
+        self.session = deque(maxlen=session_frames)
+        self.start = perf_counter()
+        self.last_frame = None
+        self.hud_lines = []
+
+    def stage(self, name):
+        if not self.enabled:
+            return _UNTIMED
+        return self.timers[name]
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+
+        now = perf_counter()
+        frame_time = 0. if self.last_frame is None else now - self.last_frame
+        self.last_frame = now
+
+        row = self.history[self.frame % len(self.history)]
+        row[0] = frame_time
+        row[1:] = self.totals
+        self.session.append((self.frame, now - self.start, *row))
+        self.totals[:] = 0
+        self.frame += 1
+
+        if self.frame % HUD_REFRESH_FRAMES == 0:
+            self.hud_lines = self.format_lines()
+
+    def get_percentiles(self, samples=None):
+        # Milliseconds, shaped (len(PERCENTILES), 1 + len(STAGES)).
+        if samples is None:
+            samples = self.history[:min(self.frame, len(self.history))]
+        if len(samples) == 0:
+            return np.zeros((len(PERCENTILES), len(STAGES) + 1))
+        return np.percentile(samples, PERCENTILES, axis=0) * 1e3
+
+    def format_lines(self):
+        percentiles = self.get_percentiles()
+        header = 'ms'.ljust(16) + ''.join(f'p{percentile}'.rjust(8) for percentile in PERCENTILES)
+        lines = [header]
+        for column, name in enumerate(('frame',) + STAGES):
+            if column > 0 and not percentiles[:, column].any():
+                continue
+            lines.append(name.ljust(16) + ''.join(f'{value:8.2f}' for value in percentiles[:, column]))
+        return lines
+
+    def summarize(self):
+        samples = np.array([row[2:] for row in self.session]).reshape(-1, len(STAGES) + 1)
+        percentiles = self.get_percentiles(samples)
+        summary = {}
+        for column, name in enumerate(('frame',) + STAGES):
+            summary[name] = {f'p{percentile}_ms': float(percentiles[row, column])
+                             for row, percentile in enumerate(PERCENTILES)}
+            summary[name]['mean_ms'] = float(samples[:, column].mean() * 1e3) if len(samples) else 0.
+        return summary
+
+    def export(self, path):
+        columns = ['frame', 'time_s', 'frame_ms'] + [f'{name}_ms' for name in STAGES]
+        rows = [[frame, time] + [value * 1e3 for value in values] for frame, time, *values in self.session]
+
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(columns)
+                writer.writerows(rows)
+            return
+
+        report = {
+            'schema': SCHEMA_VERSION,
+            'demo': self.demo,
+            'stages': list(STAGES),
+            'frames': self.frame,
+            'dropped_frames': self.frame - len(self.session),
+            'summary': self.summarize(),
+            'columns': columns,
+            'samples': rows,
+        }
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
@@ -1,58 +1,36 @@
-import random
-from pyglet.gl import *
-import numpy as np
+from ParticleEmitter import ParticleEmitter
 
-from utils import draw_particles
+TEXTURE_PATH = 'balloon.bmp'
+MINIMUM_SHARE = 0.25
 
 
-class BalloonParticle:
-    def __init__(self, position):
-        default_size = 200
-        size_difference = 50
-
-        self.position = position.copy()
-        self.life_span = random.randrange(350, 400)
-
-        self.size = random.randrange(default_size - size_difference, default_size + size_difference)
-
-        velocity_x = random.randrange(-2, 5)
-        velocity_y = random.randrange(10, 20)
-        velocity_z = random.randrange(0, 10)
-
-        self.velocity = np.array([velocity_x, velocity_y, velocity_z])
-
-    def update(self, delta_t):
-        self.life_span -= delta_t * 60
+class BalloonParticleSystem(ParticleEmitter):
+    texture_path = TEXTURE_PATH
+    minimum_share = MINIMUM_SHARE
+    collides = True
+    fragile = True
 
-        self.position = self.position + self.velocity * (delta_t * 60)
-
-
-class BalloonParticleSystem:
-    def __init__(self, num_of_particles=500):
-        self.particles = []
-        self.texture = pyglet.image.load('balloon.bmp').get_texture()
+    def __init__(self, num_of_particles=500, spawn_rate=1, manager=None, rng=None, forces=None):
         self.number_of_particles = num_of_particles
+        self.spawn_rate = spawn_rate
 
-        self.create_new_particle()
-
-    def create_new_particle(self):
+        super().__init__(num_of_particles, manager, rng, forces)
 
-        position_x = random.randrange(-3500, 3500)
-        position_y = random.randrange(-3200, -3100)
-        position_z = random.randrange(0, 10)
+    def start(self):
+        self.create_new_particles()
 
-        particle = BalloonParticle(np.array([position_x, position_y, position_z]))
-        self.particles.append(particle)
-
-    def update(self, delta_t):
-        for particle in self.particles:
-            particle.update(delta_t)
+    def create_new_particles(self, count=1):
+        default_size = 200
+        size_difference = 50
 
-            if particle.life_span <= 0:
-                self.particles.remove(particle)
+        # One draw for every attribute: position xyz, velocity xyz, size, life span.
+        values = self.rng.integers([-3500, -3200, 0, -2, 10, 0, default_size - size_difference, 350],
+                                   [3500, -3100, 10, 5, 20, 10, default_size + size_difference, 400],
+                                   size=(count, 8))
 
-        if len(self.particles) < self.number_of_particles:
-            self.create_new_particle()
+        self.spawn(values[:, 0:3], values[:, 3:6], values[:, 6], values[:, 7])
 
-    def draw(self):
-        draw_particles(self.texture, self.particles)
+    def emit(self, delta_t):
+        missing = self.scale_count(self.number_of_particles) - self.live_count()
+        if missing > 0:
+            self.create_new_particles(min(missing, self.scale_count(self.spawn_rate)))
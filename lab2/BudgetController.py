@@ -0,0 +1,79 @@
+TARGET_FRAME_TIME = 1 / 60
+# Share of the frame the simulation and draw calls may use; the rest is left for the swap and the OS.
+WORK_SHARE = 0.8
+MIN_SCALE = 0.05
+SMOOTHING = 0.1
+# Load is work time over its budget: above HIGH_LOAD the budget shrinks, below LOW_LOAD it grows, in between it holds.
+HIGH_LOAD = 1.
+LOW_LOAD = 0.8
+# Frame times this far over target mean frames are being dropped, whatever the measured work says.
+DROPPED_FRAME_LOAD = 1.25
+MAX_DECREASE = 0.25
+INCREASE_STEP = 0.02
+# Frames to wait after a change so the smoothed times reflect it before the next one.
+SETTLE_FRAMES = 10
+
+
+class BudgetController:
+    # A global quality scale driven by smoothed frame and work times: cut in proportion to the overload, grown back
+    # slowly, so big bursts degrade the show instead of the frame rate without oscillating around the target.
+    def __init__(self, target_frame_time=TARGET_FRAME_TIME, min_scale=MIN_SCALE, smoothing=SMOOTHING):
+        self.target_frame_time = target_frame_time
+        self.min_scale = min_scale
+        self.smoothing = smoothing
+        self.scale = 1.
+        self.frame_time = None
+        self.work_time = None
+        self.settle = 0
+        self.decreases = 0
+        self.increases = 0
+
+    def smooth(self, average, value):
+        return value if average is None else average + (value - average) * self.smoothing
+
+    @property
+    def load(self):
+        if self.work_time is None:
+            return 0.
+        load = self.work_time / (self.target_frame_time * WORK_SHARE)
+        # Work time misses stalls outside the measured stages, such as a GPU-bound swap.
+        frame_load = self.frame_time / self.target_frame_time
+        return max(load, frame_load) if frame_load > DROPPED_FRAME_LOAD else load
+
+    def observe(self, frame_time, work_time):
+        self.frame_time = self.smooth(self.frame_time, frame_time)
+        self.work_time = self.smooth(self.work_time, work_time)
+        if self.settle > 0:
+            self.settle -= 1
+            return self.scale
+
+        load = self.load
+        if load > HIGH_LOAD:
+            # Particle cost is roughly linear in the scale, so dividing by the load lands near the target.
+            self.scale = max(self.scale * max(HIGH_LOAD / load, 1 - MAX_DECREASE), self.min_scale)
+            self.settle = SETTLE_FRAMES
+            self.decreases += 1
+        elif load < LOW_LOAD and self.scale < 1:
+            self.scale = min(self.scale + INCREASE_STEP, 1.)
+            self.settle = SETTLE_FRAMES
+            self.increases += 1
+        return self.scale
+
+    def get_share(self, priority, minimum=0.):
+        # Priority 1 follows the global scale; lower priorities shed first and reach zero at scale 1 - priority.
+        share = 1 - (1 - self.scale) / priority if priority > 0 else 0.
+        return max(min(share, 1.), minimum)
+
+    def apply(self, emitters):
+        for emitter in emitters:
+            emitter.budget_scale = self.get_share(emitter.priority, emitter.minimum_share)
+
+    def stats(self):
+        return {
+            'scale': self.scale,
+            'load': self.load,
+            'frame_time': self.frame_time,
+            'work_time': self.work_time,
+            'decreases': self.decreases,
+            'increases': self.increases,
+        }
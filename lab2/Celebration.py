@@ -1,17 +1,111 @@
+import argparse
+import os
+import sys
+from time import perf_counter
+
 from pyglet.gl import *
 from pyglet.window import *
+from pyglet.window import key
 
 from ExplosionParticleSystem import ExplosionParticleSystem
 from BalloonParticleSystem import BalloonParticleSystem
+from BudgetController import BudgetController
+from FixedStepClock import FixedStepClock
+from ForceField import RadialBlast, create_balloon_forces, create_debris_forces
+from ParticleInteractions import ParticleInteractions
+from ParticleManager import ParticleManager
+from ParticleRecording import PRECISIONS, ParticleRecorder, ParticleRecording, ParticleReplay
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from profiler import SESSION_FRAMES, FrameProfiler
+
+SIMULATION_STEP = 1 / 60
+RENDER_INTERVAL = 1 / 60
+TARGET_FPS = 60
+HUD_FONT_SIZE = 10
+HUD_MARGIN = 8
+SCRUB_SECONDS = 5
+
+parser = argparse.ArgumentParser(description='Balloon and fireworks particle demo.')
+parser.add_argument('--gpu', action='store_true', help='animate particles in a vertex shader instead of on the CPU')
+parser.add_argument('--profile', action='store_true', help='time each frame stage; H toggles the overlay')
+parser.add_argument('--profile-output', help='write the per-frame stage times to this .csv or .json file on exit')
+parser.add_argument('--profile-frames', type=int, default=SESSION_FRAMES,
+                    help='most recent frames kept for --profile-output')
+parser.add_argument('--target-fps', type=float, default=TARGET_FPS,
+                    help='frame rate the particle budget is scaled to hold')
+parser.add_argument('--fixed-budget', action='store_true', help='always emit the full particle counts')
+parser.add_argument('--forces', action='store_true',
+                    help='balloons float on buoyancy, wind and turbulence and are shoved by blasts; debris falls '
+                         '(CPU particles only)')
+parser.add_argument('--interactions', action='store_true',
+                    help='balloons bounce off each other and pop on explosion debris (CPU particles only)')
+parser.add_argument('--record', help='stream the particle state of every tick to this file')
+parser.add_argument('--record-precision', choices=PRECISIONS, default=PRECISIONS[0],
+                    help='float16 halves the file but rounds positions to the float16 grid: steps of 1 unit within '
+                         '2048 of the origin, 2 within 4096 and 4 within 8192')
+parser.add_argument('--record-compression', type=int, default=0, choices=range(10), metavar='LEVEL',
+                    help='zlib level for recorded chunks, 0 to store them uncompressed')
+parser.add_argument('--replay', help='draw a recording instead of simulating; space pauses, arrows scrub, '
+                                     'Home and End jump to either end')
+arguments = parser.parse_args()
+if arguments.record and arguments.gpu:
+    parser.error('--record needs CPU particles, not --gpu')
+
+profiler = FrameProfiler('celebration', enabled=arguments.profile or arguments.profile_output is not None,
+                         session_frames=arguments.profile_frames)
+
+
+class CelebrationWindow(pyglet.window.Window):
+    def flip(self):
+        with profiler.stage('swap'):
+            super().flip()
+        profiler.end_frame()
+        end_frame()
 
-window = pyglet.window.Window(width=800, height=650)
 
-ExplosionParticleSystem = ExplosionParticleSystem()
-BalloonParticleSystem = BalloonParticleSystem(200)
+window = CelebrationWindow(width=800, height=650)
+hud = pyglet.text.Label('', font_name='Courier New', font_size=HUD_FONT_SIZE, x=HUD_MARGIN, y=HUD_MARGIN,
+                        anchor_y='bottom', multiline=True, width=window.width, color=(255, 255, 255, 255))
+hud_visible = arguments.profile
+
+budget = None if arguments.fixed_budget or arguments.replay else BudgetController(1 / arguments.target_fps)
+# Update and draw time spent since the last flip, and when that flip happened.
+work_time = 0.
+last_flip = None
+# Set while a frame loads textures and builds renderers on first draw; such frames say nothing about the steady load.
+loading_frame = False
+
+clock = FixedStepClock(SIMULATION_STEP)
+recorder = None
+replay = None
+paused = False
+if arguments.replay:
+    try:
+        recording = ParticleRecording(arguments.replay)
+    except ValueError as error:
+        parser.error(str(error))
+    replay = ParticleReplay(recording, profiler)
+    clock = FixedStepClock(replay.recording.delta_t)
+    particle_manager = replay
+else:
+    particle_manager = ParticleManager(gpu=arguments.gpu, profiler=profiler,
+                                       interactions=ParticleInteractions() if arguments.interactions else None)
+    blast = RadialBlast() if arguments.forces else None
+    BalloonParticleSystem(200, manager=particle_manager,
+                          forces=create_balloon_forces(blast) if arguments.forces else None)
+    ExplosionParticleSystem(manager=particle_manager, forces=create_debris_forces() if arguments.forces else None,
+                            blast=blast)
+    if arguments.record:
+        recorder = ParticleRecorder(arguments.record, SIMULATION_STEP, arguments.record_precision,
+                                    arguments.record_compression, metadata=vars(arguments))
 
 
 @window.event
 def on_draw():
+    global work_time, loading_frame
+    start = perf_counter()
+    loading_frame = loading_frame or any(layer.renderer is None for layer in particle_manager.layers.values())
     window.clear()
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
     glMatrixMode(GL_PROJECTION)
@@ -24,17 +118,84 @@ def on_draw():
     gluLookAt(0, 0, 6000, 0, 0, 0, 0, 1.0, 0)
 
     glPushMatrix()
-    BalloonParticleSystem.draw()
-    ExplosionParticleSystem.draw()
+    particle_manager.draw(1. if paused else clock.alpha)
     glPopMatrix()
+
+    if hud_visible and profiler.enabled:
+        draw_hud()
     glFlush()
+    work_time += perf_counter() - start
+
+
+def draw_hud():
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    glOrtho(0, window.width, 0, window.height, -1, 1)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+
+    lines = profiler.hud_lines
+    if budget is not None:
+        lines = lines + [f'budget scale {budget.scale:.2f}  load {budget.load:.2f}']
+    hud.text = '\n'.join(lines)
+    hud.draw()
+
+
+@window.event
+def on_key_press(symbol, modifiers):
+    global hud_visible, paused
+    if symbol == key.H:
+        hud_visible = not hud_visible
+    if replay is None:
+        return
+
+    # Scrubbing only moves the read position in the memory-mapped recording, so jumps are instant.
+    scrub_steps = round(SCRUB_SECONDS / replay.recording.delta_t)
+    if symbol == key.SPACE:
+        paused = not paused
+    elif symbol == key.LEFT:
+        replay.seek_step(replay.step - scrub_steps)
+    elif symbol == key.RIGHT:
+        replay.seek_step(replay.step + scrub_steps)
+    elif symbol == key.HOME:
+        replay.seek_step(0)
+    elif symbol == key.END:
+        replay.seek_step(replay.recording.steps)
 
 
 def update(delta_t):
-    ExplosionParticleSystem.update(delta_t)
-    BalloonParticleSystem.update(delta_t)
+    global work_time
+    start = perf_counter()
+    steps = clock.advance(delta_t)
+    if replay is not None:
+        if steps and not paused:
+            replay.advance(steps)
+    elif steps:
+        particle_manager.update(clock.step, steps)
+        if recorder is not None:
+            recorder.record(particle_manager, steps)
+    work_time += perf_counter() - start
+
 
+def end_frame():
+    global work_time, last_flip, loading_frame
+    now = perf_counter()
+    if budget is not None and last_flip is not None and not loading_frame:
+        budget.observe(now - last_flip, work_time)
+        budget.apply(particle_manager.emitters)
+    work_time = 0.
+    last_flip = now
+    loading_frame = False
 
-pyglet.clock.schedule_interval(update, 1 / 60)
+
+pyglet.clock.schedule_interval(update, RENDER_INTERVAL)
 
 pyglet.app.run()
+
+if recorder is not None:
+    recorder.close()
+if replay is not None:
+    replay.close()
+
+if arguments.profile_output:
+    profiler.export(arguments.profile_output)
@@ -1,74 +1,63 @@
-import random
-from pyglet.gl import *
 import numpy as np
 
-from utils import draw_particles
+from ParticleEmitter import ParticleEmitter
 
+TEXTURE_PATH = 'explosion.bmp'
+MIN_SIZE_RATIO = 0.2
+POOL_CAPACITY = 1024
+PRIORITY = 0.6
+MINIMUM_SHARE = 0.05
 
-class ExplosionParticle:
-    def __init__(self, position):
-        self.position = position.copy()
-
-        default_size = 250
-        delta_size = 25
-        self.size = random.randrange(default_size - delta_size, default_size + delta_size)
-        self.creation_size = self.size
-
-        velocity_x = random.randrange(-20, 20)
-        velocity_y = random.randrange(-10, 30)
-        velocity_z = random.randrange(-10, 10)
-
-        if abs(velocity_x) > 10 and abs(velocity_y) > 10:
-            self.life_span = random.randrange(10, 15)
-        else:
-            self.life_span = random.randrange(30, 50)
-        self.creation_life_span = self.life_span
-
-        self.velocity = np.array([velocity_x, velocity_y, velocity_z])
-
-    def update(self, delta_t):
-        self.life_span = self.life_span - delta_t * 60
-        self.size = self.creation_size * max(self.life_span / self.creation_life_span, 0.2)
-
-        self.position = self.position + self.velocity * (delta_t * 60)
 
+class ExplosionParticleSystem(ParticleEmitter):
+    texture_path = TEXTURE_PATH
+    min_size_ratio = MIN_SIZE_RATIO
+    priority = PRIORITY
+    minimum_share = MINIMUM_SHARE
+    debris = True
 
-class ExplosionParticleSystem:
-    def __init__(self):
-        self.particles = []
-
-        self.texture = pyglet.image.load("explosion.bmp").get_texture()
-        self.number_of_particles = 100
+    def __init__(self, capacity=POOL_CAPACITY, interval=45, manager=None, rng=None, forces=None, blast=None,
+                 burst_size=None):
+        self.number_of_particles = 100 if burst_size is None else burst_size
+        # Every burst has this many particles instead of a random count, e.g. for a repeatable benchmark load.
+        self.burst_size = burst_size
+        self.interval = interval
         self.timer = 0
+        # A RadialBlast shared with other emitters, triggered at every burst.
+        self.blast = blast
+
+        super().__init__(capacity, manager, rng, forces)
 
+    def start(self):
         self.create_explosion()
 
     def create_explosion(self):
+        default_size = 250
+        delta_size = 25
+        count = self.scale_count(self.number_of_particles)
 
-        position_x = random.randrange(-1500, 1500)
-        position_y = random.randrange(-1500, 1500)
-        z_position = random.randrange(-750, 750)
+        position = self.rng.integers([-1500, -1500, -750], [1500, 1500, 750])
 
-        for i in range(self.number_of_particles):
-            particle = ExplosionParticle(np.array([position_x, position_y, z_position]))
-            self.particles.append(particle)
+        # One draw for the whole burst: velocity xyz, size, fast life span, slow life span.
+        values = self.rng.integers([-20, -10, -10, default_size - delta_size, 10, 30],
+                                   [20, 30, 10, default_size + delta_size, 15, 50],
+                                   size=(count, 6))
+        velocities = values[:, 0:3]
+        fast = (np.abs(velocities[:, 0]) > 10) & (np.abs(velocities[:, 1]) > 10)
+        life_spans = np.where(fast, values[:, 4], values[:, 5])
 
-    def update(self, delta_t):
-        self.timer += delta_t * 60
+        self.spawn(np.broadcast_to(position, (count, 3)), velocities, values[:, 3], life_spans)
+        if self.blast is not None:
+            self.blast.trigger(position)
 
-        for particle in self.particles:
-            particle.update(delta_t)
-            if particle.life_span <= 0:
-                self.particles.remove(particle)
+    def emit(self, delta_t):
+        self.timer += delta_t * 60
 
-        if self.timer % 45 < 1:
-            self.number_of_particles = int(random.randint(20, 200) * (self.timer % 45 + 30) / 40)
-            print(self.number_of_particles)
+        if self.timer % self.interval < 1:
+            if self.burst_size is None:
+                self.number_of_particles = int(self.rng.integers(20, 200, endpoint=True)
+                                               * (self.timer % self.interval + 30) / 40)
             self.create_explosion()
 
         if self.timer > 900:
             self.timer = 0
-
-    def draw(self):
-
-        draw_particles(self.texture, self.particles)
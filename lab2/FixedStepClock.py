@@ -0,0 +1,34 @@
+DEFAULT_STEP = 1 / 60
+DEFAULT_MAX_STEPS = 10
+
+
+class FixedStepClock:
+    def __init__(self, step=DEFAULT_STEP, max_steps=DEFAULT_MAX_STEPS):
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0.
+        self.steps = 0
+        self.dropped_steps = 0
+
+    def advance(self, delta_t):
+        self.accumulator += delta_t
+        steps = int(self.accumulator // self.step)
+
+        # Past max_steps the simulation could never catch up, so the backlog is dropped instead of replayed.
+        if steps > self.max_steps:
+            self.dropped_steps += steps - self.max_steps
+            steps = self.max_steps
+            self.accumulator = 0.
+        else:
+            self.accumulator -= steps * self.step
+
+        self.steps += steps
+        return steps
+
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.step, 1.)
+
+    @property
+    def time(self):
+        return self.steps * self.step
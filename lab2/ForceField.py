@@ -0,0 +1,188 @@
+from time import perf_counter
+
+import numpy as np
+
+from GpuParticleStore import GpuParticleStore
+
+# Velocities are in scene units per 60 Hz frame, so accelerations are in units per frame squared.
+FRAMES_PER_SECOND = 60
+GRAVITY = 0.35
+WIND = (0.08, 0., 0.)
+GUST_STRENGTH = 0.5
+GUST_PERIOD = 4.
+DRAG = 0.02
+BALLOON_LIFT = 0.3
+BALLOON_REFERENCE_SIZE = 200.
+BLAST_STRENGTH = 12.
+BLAST_RADIUS = 1500.
+TURBULENCE_SCALE = 1 / 900
+TURBULENCE_STRENGTH = 0.15
+TURBULENCE_SPEED = 0.3
+
+
+class Gravity:
+    name = 'gravity'
+
+    def __init__(self, acceleration=(0., -GRAVITY, 0.)):
+        self.acceleration = np.asarray(acceleration, dtype=float)
+
+    def apply(self, positions, velocities, sizes, frames, time):
+        velocities += self.acceleration * frames
+
+
+class Wind:
+    # A steady push along the wind direction that swells and fades with period GUST_PERIOD seconds.
+    name = 'wind'
+
+    def __init__(self, acceleration=WIND, gust=GUST_STRENGTH, period=GUST_PERIOD):
+        self.acceleration = np.asarray(acceleration, dtype=float)
+        self.gust = gust
+        self.period = period
+
+    def apply(self, positions, velocities, sizes, frames, time):
+        velocities += self.acceleration * ((1 + self.gust * np.sin(2 * np.pi * time / self.period)) * frames)
+
+
+class Drag:
+    # Exponential decay is exact for any step, so long catch-up batches cannot overshoot and reverse particles.
+    name = 'drag'
+
+    def __init__(self, coefficient=DRAG):
+        self.coefficient = coefficient
+
+    def apply(self, positions, velocities, sizes, frames, time):
+        velocities *= np.exp(-self.coefficient * frames)
+
+
+class Buoyancy:
+    # Lift grows with volume and drag with area, so larger balloons settle on a faster climb.
+    name = 'buoyancy'
+
+    def __init__(self, lift=BALLOON_LIFT, reference_size=BALLOON_REFERENCE_SIZE):
+        self.lift = lift
+        self.reference_size = reference_size
+
+    def apply(self, positions, velocities, sizes, frames, time):
+        velocities[:, 1] += sizes * (self.lift / self.reference_size * frames)
+
+
+class RadialBlast:
+    # One-off outward impulses, strongest at the centre and fading to nothing at radius. Blasts triggered during
+    # a tick are applied on the next force pass and then forgotten.
+    name = 'blast'
+
+    def __init__(self, strength=BLAST_STRENGTH, radius=BLAST_RADIUS):
+        self.strength = strength
+        self.radius = radius
+        self.pending = []
+        self.centers = np.zeros((0, 3))
+
+    def trigger(self, center):
+        self.pending.append(center)
+
+    def begin_pass(self):
+        self.centers = np.array(self.pending, dtype=float).reshape(-1, 3)
+        self.pending = []
+
+    def apply(self, positions, velocities, sizes, frames, time):
+        for center in self.centers:
+            offsets = positions - center
+            distances = np.sqrt(np.einsum('ij,ij->i', offsets, offsets))
+            hit = (distances < self.radius) & (distances > 0)
+            scale = self.strength * (1 - distances[hit] / self.radius) / distances[hit]
+            velocities[hit] += offsets[hit] * scale[:, None]
+
+
+class Turbulence:
+    # Curl noise: the drifting ABC flow is divergence-free, so it swirls particles without bunching them up.
+    name = 'turbulence'
+
+    def __init__(self, scale=TURBULENCE_SCALE, strength=TURBULENCE_STRENGTH, speed=TURBULENCE_SPEED):
+        self.scale = scale
+        self.strength = strength
+        self.speed = speed
+
+    def apply(self, positions, velocities, sizes, frames, time):
+        # Single precision is plenty for a noise phase, and NumPy's float32 sine and cosine are many times faster.
+        scaled = np.multiply(positions, self.scale, dtype=np.float32)
+        scaled += np.float32(time * self.speed % (2 * np.pi))
+        sines = np.sin(scaled)
+        cosines = np.cos(scaled)
+        strength = self.strength * frames
+        velocities[:, 0] += (sines[:, 2] + cosines[:, 1]) * strength
+        velocities[:, 1] += (sines[:, 0] + cosines[:, 2]) * strength
+        velocities[:, 2] += (sines[:, 1] + cosines[:, 0]) * strength
+
+
+def create_balloon_forces(blast=None):
+    forces = [Buoyancy(), Wind(), Turbulence(), Drag()]
+    return forces + [blast] if blast is not None else forces
+
+
+def create_debris_forces():
+    return [Gravity(), Drag()]
+
+
+class ForcePipeline:
+    # Runs each emitter's force stages on its particles' velocities before the manager integrates positions.
+    # Emitters with the same stages are handled together: their particles are gathered once, every stage updates
+    # the gathered arrays in place, and the velocities are scattered back. Particles on the GPU keep their
+    # closed-form motion.
+    def __init__(self):
+        self.time = 0.
+        self.timings = {}
+
+    def get_groups(self, emitters):
+        # Stage tuple -> mask over emitter indices.
+        groups = {}
+        for emitter in emitters:
+            if emitter.forces:
+                groups.setdefault(tuple(emitter.forces), np.zeros(len(emitters), dtype=bool))[emitter.index] = True
+        return groups
+
+    def record(self, name, start):
+        self.timings[name] = self.timings.get(name, 0.) + perf_counter() - start
+
+    def apply(self, manager, delta_t):
+        groups = self.get_groups(manager.emitters)
+        self.time += delta_t
+        if not groups:
+            return
+
+        stages = list({stage: None for forces in groups for stage in forces})
+        for stage in stages:
+            if hasattr(stage, 'begin_pass'):
+                stage.begin_pass()
+
+        frames = delta_t * FRAMES_PER_SECOND
+        for layer in manager.layers.values():
+            particles = layer.particles
+            if isinstance(particles, GpuParticleStore) or len(particles) == 0:
+                continue
+            for forces, members in groups.items():
+                start = perf_counter()
+                selected = members[particles.emitters]
+                everyone = selected.all()
+                if everyone:
+                    positions, velocities, sizes = particles.positions, particles.velocities, particles.sizes
+                else:
+                    selected = np.flatnonzero(selected)
+                    if len(selected) == 0:
+                        continue
+                    positions = particles.positions[selected]
+                    velocities = particles.velocities[selected]
+                    sizes = particles.sizes[selected]
+                self.record('gather', start)
+
+                for stage in forces:
+                    start = perf_counter()
+                    stage.apply(positions, velocities, sizes, frames, self.time)
+                    self.record(stage.name, start)
+
+                if not everyone:
+                    start = perf_counter()
+                    particles.velocities[selected] = velocities
+                    self.record('gather', start)
+
+    def stats(self):
+        return dict(self.timings)
@@ -0,0 +1,168 @@
+import heapq
+
+import numpy as np
+
+from quads import QUAD_TEXCOORDS, VERTICES_PER_QUAD
+
+# Per vertex: origin xyz, velocity xyz, corner uv, then spawn time, life span, size and minimum size ratio.
+RECORD_COMPONENTS = 12
+ORIGIN_OFFSET = 0
+VELOCITY_OFFSET = 3
+CORNER_OFFSET = 6
+TIMING_OFFSET = 8
+
+
+class GpuParticleStore:
+    def __init__(self, capacity=0):
+        self.capacity = capacity
+        self.time = 0.
+        self.head = 0
+        self.total_spawned = 0
+
+        # Spawns are staged here until the renderer uploads them.
+        self.count = 0
+        self.pending = []
+        self.slot_expiries = np.zeros(capacity)
+
+        self.expiry_batches = []
+        self.batch_serial = 0
+        self.live_counts = np.zeros(0, dtype=np.int64)
+
+        self.peak_count = 0
+        self.spawned = 0
+        self.died = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return int(self.live_counts.sum())
+
+    def grow(self, capacity):
+        if capacity <= self.capacity:
+            return
+
+        slot_expiries = np.zeros(capacity)
+        slot_expiries[:self.capacity] = self.slot_expiries
+        self.slot_expiries = slot_expiries
+        self.capacity = capacity
+
+    def free_slots(self):
+        return self.capacity - len(self)
+
+    def add(self, positions, velocities, sizes, life_spans, emitter=0, min_size_ratio=1., age=0., last_delta_t=None):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        velocities = np.asarray(velocities, dtype=float).reshape(-1, 3)
+
+        requested = len(positions)
+        number = min(requested, self.free_slots())
+        self.dropped += requested - number
+        if number == 0:
+            return 0
+
+        life_spans = np.broadcast_to(np.asarray(life_spans, dtype=float), requested)[:number]
+        spawn_time = self.time - age
+        self.pending.append({
+            'positions': positions[:number],
+            'velocities': velocities[:number],
+            'sizes': np.broadcast_to(np.asarray(sizes, dtype=float), requested)[:number],
+            'life_spans': life_spans,
+            'min_size_ratio': min_size_ratio,
+            'spawn_times': np.full(number, spawn_time),
+        })
+        self.count += number
+
+        if emitter >= len(self.live_counts):
+            self.live_counts = np.concatenate((self.live_counts, np.zeros(emitter + 1 - len(self.live_counts),
+                                                                          dtype=np.int64)))
+        self.live_counts[emitter] += number
+        expiries = np.sort(spawn_time + life_spans / 60)
+        heapq.heappush(self.expiry_batches, (expiries[0], self.batch_serial, emitter, expiries, 0))
+        self.batch_serial += 1
+
+        self.spawned += number
+        self.peak_count = max(self.peak_count, len(self))
+        return number
+
+    def update(self, delta_t, last_delta_t=None):
+        self.time += delta_t
+        self.retire()
+
+    def retire(self):
+        while self.expiry_batches and self.expiry_batches[0][0] <= self.time:
+            _, serial, emitter, expiries, index = heapq.heappop(self.expiry_batches)
+            expired = int(np.searchsorted(expiries, self.time, side='right'))
+            self.live_counts[emitter] -= expired - index
+            self.died += expired - index
+            if expired < len(expiries):
+                heapq.heappush(self.expiry_batches, (expiries[expired], serial, emitter, expiries, expired))
+
+    def remove_dead(self):
+        pass
+
+    def counts_by_emitter(self, emitter_count):
+        counts = np.zeros(emitter_count, dtype=np.int64)
+        counts[:len(self.live_counts)] = self.live_counts[:emitter_count]
+        return counts
+
+    def take_pending(self):
+        # Returns (first slot, vertex records) chunks for the ring buffer, split where the ring wraps.
+        if not self.pending:
+            return []
+
+        count = self.count
+        records = np.zeros((count, VERTICES_PER_QUAD, RECORD_COMPONENTS), dtype=np.float32)
+        offset = 0
+        for batch in self.pending:
+            size = len(batch['spawn_times'])
+            chunk = records[offset:offset + size]
+            chunk[:, :, ORIGIN_OFFSET:ORIGIN_OFFSET + 3] = batch['positions'][:, None]
+            chunk[:, :, VELOCITY_OFFSET:VELOCITY_OFFSET + 3] = batch['velocities'][:, None]
+            chunk[:, :, CORNER_OFFSET:CORNER_OFFSET + 2] = QUAD_TEXCOORDS
+            chunk[:, :, TIMING_OFFSET] = batch['spawn_times'][:, None]
+            chunk[:, :, TIMING_OFFSET + 1] = batch['life_spans'][:, None]
+            chunk[:, :, TIMING_OFFSET + 2] = batch['sizes'][:, None]
+            chunk[:, :, TIMING_OFFSET + 3] = batch['min_size_ratio']
+            offset += size
+
+        self.pending = []
+        self.count = 0
+
+        # More spawns than the ring holds in one frame: only the newest ones survive anyway.
+        if count > self.capacity:
+            records = records[count - self.capacity:]
+            self.head = (self.head + count - self.capacity) % self.capacity
+            count = self.capacity
+
+        slots = (self.head + np.arange(count)) % self.capacity
+        expiries = records[:, 0, TIMING_OFFSET] + records[:, 0, TIMING_OFFSET + 1] / 60
+        self.evicted += int(np.count_nonzero(self.slot_expiries[slots] > self.time))
+        self.slot_expiries[slots] = expiries
+        self.total_spawned += count
+
+        chunks = []
+        first = min(count, self.capacity - self.head)
+        chunks.append((self.head, records[:first]))
+        if first < count:
+            chunks.append((0, records[first:]))
+        self.head = (self.head + count) % self.capacity
+        return chunks
+
+    def drawn_count(self):
+        return min(self.total_spawned, self.capacity)
+
+    def close(self):
+        pass
+
+    def stats(self):
+        count = len(self)
+        return {
+            'capacity': self.capacity,
+            'count': count,
+            'occupancy': count / self.capacity if self.capacity else 0.,
+            'peak_count': self.peak_count,
+            'peak_occupancy': self.peak_count / self.capacity if self.capacity else 0.,
+            'spawned': self.spawned,
+            'died': self.died,
+            'dropped': self.dropped,
+            'evicted': self.evicted,
+        }
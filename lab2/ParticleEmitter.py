@@ -0,0 +1,66 @@
+import numpy as np
+
+from ParticleManager import ParticleManager
+
+
+class ParticleEmitter:
+    texture_path = None
+    min_size_ratio = 1.
+    # Budget shedding: lower priorities give up particles first, and minimum_share is never taken away.
+    priority = 1.
+    minimum_share = 0.
+    # Interactions, when the manager runs them: colliding particles bounce off each other, fragile ones are
+    # destroyed on contact with debris.
+    collides = False
+    fragile = False
+    debris = False
+    # Force stages run on this emitter's particles every tick, in order; none keeps the closed-form motion.
+    forces = ()
+
+    def __init__(self, capacity, manager=None, rng=None, forces=None):
+        self.capacity = capacity
+        if forces is not None:
+            self.forces = tuple(forces)
+        self.budget_scale = 1.
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.manager = None
+        self.particles = None
+        self.index = None
+
+        if manager is None:
+            manager = ParticleManager()
+        manager.add_emitter(self)
+
+    def start(self):
+        pass
+
+    def emit(self, delta_t):
+        raise NotImplementedError
+
+    def live_count(self):
+        return int(self.manager.live_counts[self.index])
+
+    def live_limit(self):
+        return int(self.capacity * self.budget_scale)
+
+    def scale_count(self, count):
+        # Scaled emission keeps at least one particle, so a throttled emitter still visibly runs.
+        return max(int(count * self.budget_scale), 1) if count > 0 else 0
+
+    def spawn(self, positions, velocities, sizes, life_spans):
+        allowed = max(self.live_limit() - self.live_count(), 0)
+        if allowed < len(positions):
+            sizes = np.broadcast_to(sizes, len(positions))[:allowed]
+            life_spans = np.broadcast_to(life_spans, len(positions))[:allowed]
+            positions = positions[:allowed]
+            velocities = velocities[:allowed]
+        if allowed == 0:
+            return 0
+        return self.manager.spawn(self, positions, velocities, sizes, life_spans)
+
+    # Shortcuts for an emitter that owns its manager; emitters sharing a manager are updated and drawn through it.
+    def update(self, delta_t):
+        self.manager.update(delta_t)
+
+    def draw(self):
+        self.manager.draw()
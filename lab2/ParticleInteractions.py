@@ -0,0 +1,92 @@
+import numpy as np
+
+from GpuParticleStore import GpuParticleStore
+from kernels import resolve_contacts
+from SpatialHash import SpatialHash
+
+
+class ParticleInteractions:
+    # Contacts between particles, found through a spatial hash rebuilt every tick. Emitters
+    # opt in through class attributes: colliding particles bounce off each other, fragile ones pop on debris.
+    # Particles kept on the GPU never take part.
+    def __init__(self, collisions=True, popping=True):
+        self.collisions = collisions
+        self.popping = popping
+        self.grid = SpatialHash(1.)
+        self.pair_count = 0
+        self.collision_count = 0
+        self.popped_count = 0
+
+    def get_flags(self, emitters, name):
+        return np.array([getattr(emitter, name) for emitter in emitters], dtype=bool)
+
+    def apply(self, manager):
+        stores = [layer.particles for layer in manager.layers.values()
+                  if not isinstance(layer.particles, GpuParticleStore) and len(layer.particles) > 0]
+        self.pair_count = self.collision_count = 0
+        if not stores:
+            return
+
+        collides = self.get_flags(manager.emitters, 'collides') & self.collisions
+        fragile = self.get_flags(manager.emitters, 'fragile') & self.popping
+        debris = self.get_flags(manager.emitters, 'debris') & self.popping
+        emitters = np.concatenate([particles.emitters for particles in stores])
+        # Only colliding and fragile particles go into the grid; debris looks itself up in it, so the dense
+        # clouds of a fresh explosion never produce the debris-to-debris pairs no rule cares about.
+        members = np.flatnonzero((collides | fragile)[emitters])
+        hits = np.flatnonzero(debris[emitters]) if fragile.any() else np.zeros(0, dtype=np.int64)
+        if len(members) == 0 or (len(members) < 2 and len(hits) == 0):
+            return
+
+        bounds = np.cumsum([0] + [len(particles) for particles in stores])
+        positions = np.concatenate([particles.positions for particles in stores])
+        radii = np.concatenate([particles.sizes for particles in stores]) / 2
+        member_radii = radii[members]
+        member_emitters = emitters[members]
+        self.grid.build(positions[members], 2 * max(member_radii.max(), radii[hits].max(initial=0.)))
+
+        popped = np.zeros(len(positions), dtype=bool)
+        if len(hits) > 0:
+            hit_indices, targets = self.grid.query(positions[hits], member_radii.max() + radii[hits].max())
+            hit_indices = hits[hit_indices]
+            offsets = positions[members[targets]] - positions[hit_indices]
+            reach = member_radii[targets] + radii[hit_indices]
+            touching = ((np.einsum('ij,ij->i', offsets, offsets) < reach * reach)
+                        & fragile[member_emitters[targets]] & (members[targets] != hit_indices))
+            popped[members[targets[touching]]] = True
+            self.pair_count += int(np.count_nonzero(touching))
+
+        if collides.any() and len(members) > 1:
+            first, second = self.grid.find_pairs(member_radii)
+            self.pair_count += len(first)
+            bouncing = (collides[member_emitters[first]] & collides[member_emitters[second]]
+                        & ~popped[members[first]] & ~popped[members[second]])
+            first = first[bouncing]
+            second = second[bouncing]
+            self.collision_count = len(first)
+
+            if len(first) > 0:
+                velocities = np.concatenate([particles.velocities for particles in stores])[members]
+                corrections, exchanged = resolve_contacts(positions[members], velocities, member_radii, first, second)
+                for particles, start, stop in zip(stores, bounds[:-1], bounds[1:]):
+                    inside = (members >= start) & (members < stop)
+                    slots = members[inside] - start
+                    # The previous positions move along, so interpolation between ticks does not show the push.
+                    particles.positions[slots] += corrections[inside]
+                    particles.previous_positions[slots] += corrections[inside]
+                    particles.velocities[slots] += exchanged[inside]
+
+        if popped.any():
+            self.popped_count += int(np.count_nonzero(popped))
+            for particles, start, stop in zip(stores, bounds[:-1], bounds[1:]):
+                if popped[start:stop].any():
+                    particles.life_spans[popped[start:stop]] = 0
+                    particles.remove_dead()
+            manager.count_particles()
+
+    def stats(self):
+        return {
+            'pairs': self.pair_count,
+            'collisions': self.collision_count,
+            'popped': self.popped_count,
+        }
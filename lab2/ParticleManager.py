@@ -0,0 +1,136 @@
+from contextlib import nullcontext
+
+import pyglet
+import numpy as np
+
+from ForceField import ForcePipeline
+from GpuParticleStore import GpuParticleStore
+from ParticleStore import ParticleStore
+from SharedParticleStore import SharedParticleStore, create_worker_pool
+
+
+class ParticleLayer:
+    def __init__(self, texture_path, particles, stage):
+        self.texture_path = texture_path
+        self.texture = None
+        self.particles = particles
+        self.renderer = None
+        self.stage = stage
+
+    def create_renderer(self):
+        if self.texture is None:
+            self.texture = pyglet.image.load(self.texture_path).get_texture()
+
+        if isinstance(self.particles, GpuParticleStore):
+            from ShaderParticleRenderer import ShaderParticleRenderer
+            return ShaderParticleRenderer(self.texture, self.stage)
+
+        from ParticleRenderer import ParticleRenderer
+        return ParticleRenderer(self.texture, self.stage)
+
+    def draw(self, alpha=1., step_delta_t=0.):
+        if self.renderer is None:
+            self.renderer = self.create_renderer()
+
+        if isinstance(self.particles, GpuParticleStore):
+            self.renderer.draw(self.particles, self.particles.time - (1 - alpha) * step_delta_t)
+        else:
+            self.renderer.draw(self.particles, alpha)
+
+
+class ParticleManager:
+    def __init__(self, workers=0, gpu=False, profiler=None, interactions=None):
+        self.workers = workers
+        self.gpu = gpu
+        self.profiler = profiler
+        self.interactions = interactions
+        self.forces = ForcePipeline()
+        self.pool = create_worker_pool(workers) if workers > 1 and not gpu else None
+        self.emitters = []
+        self.layers = {}
+        self.live_counts = np.zeros(0, dtype=np.int64)
+        self.step_delta_t = 0.
+        self.catch_up_delta_t = 0.
+
+    def __len__(self):
+        return sum(len(layer.particles) for layer in self.layers.values())
+
+    def layer(self, texture_path):
+        if texture_path not in self.layers:
+            if self.gpu:
+                particles = GpuParticleStore(0)
+            elif self.pool is not None:
+                particles = SharedParticleStore(0, self.pool, self.workers)
+            else:
+                particles = ParticleStore(0)
+            self.layers[texture_path] = ParticleLayer(texture_path, particles, self.stage)
+        return self.layers[texture_path]
+
+    def stage(self, name):
+        return self.profiler.stage(name) if self.profiler is not None else nullcontext()
+
+    def set_texture(self, texture_path, texture):
+        self.layer(texture_path).texture = texture
+
+    def add_emitter(self, emitter):
+        layer = self.layer(emitter.texture_path)
+        layer.particles.grow(layer.particles.capacity + emitter.capacity)
+
+        emitter.index = len(self.emitters)
+        emitter.manager = self
+        emitter.particles = layer.particles
+        self.emitters.append(emitter)
+        self.live_counts = np.append(self.live_counts, 0)
+
+        emitter.start()
+        return emitter
+
+    def spawn(self, emitter, positions, velocities, sizes, life_spans):
+        # Particles spawned during an earlier catch-up step are aged by the steps still left in the batch.
+        spawned = emitter.particles.add(positions, velocities, sizes, life_spans, emitter.index,
+                                        emitter.min_size_ratio, self.catch_up_delta_t, self.step_delta_t)
+        self.live_counts[emitter.index] += spawned
+        return spawned
+
+    def count_particles(self):
+        self.live_counts[:] = 0
+        for layer in self.layers.values():
+            self.live_counts += layer.particles.counts_by_emitter(len(self.emitters))
+
+    def update(self, delta_t, steps=1):
+        with self.stage('update'):
+            # Several fixed steps are integrated as one batch: motion is closed-form in time, so only the emitters
+            # have to run once per step. Forces change the velocities once per batch, before positions move.
+            self.forces.apply(self, delta_t * steps)
+            for layer in self.layers.values():
+                layer.particles.update(delta_t * steps, delta_t)
+            self.count_particles()
+            # Contacts are resolved once per batch of steps, on the positions at its end.
+            if self.interactions is not None:
+                self.interactions.apply(self)
+
+            self.step_delta_t = delta_t
+            with self.stage('spawn'):
+                for step in range(steps):
+                    self.catch_up_delta_t = (steps - 1 - step) * delta_t
+                    for emitter in self.emitters:
+                        emitter.emit(delta_t)
+                self.catch_up_delta_t = 0.
+
+            if steps > 1:
+                for layer in self.layers.values():
+                    layer.particles.remove_dead()
+
+    def draw(self, alpha=1.):
+        for layer in self.layers.values():
+            layer.draw(alpha, self.step_delta_t)
+
+    def close(self):
+        for layer in self.layers.values():
+            layer.particles.close()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def stats(self):
+        return {texture_path: layer.particles.stats() for texture_path, layer in self.layers.items()}
@@ -0,0 +1,262 @@
+import json
+import mmap
+import struct
+import zlib
+from contextlib import nullcontext
+
+import numpy as np
+
+from GpuParticleStore import GpuParticleStore
+from ParticleManager import ParticleLayer
+
+MAGIC = b'PREC'
+VERSION = 1
+# Magic and version at the start; JSON footer length and magic at the end.
+HEADER = struct.Struct('<4sI')
+TRAILER = struct.Struct('<Q4s')
+CHUNK_TICKS = 60
+CHUNK_ALIGNMENT = 16
+PRECISIONS = ('float32', 'float16')
+
+
+class RecordedParticles:
+    # Just enough of a particle store for the renderers. The previous positions are stored as the displacement of
+    # the last step, which stays small and keeps its precision even in float16.
+    def __init__(self, positions, steps, sizes):
+        self.positions = positions
+        self.steps = steps
+        self.sizes = sizes
+        self.count = len(sizes)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def previous_positions(self):
+        return self.positions - self.steps
+
+
+EMPTY_PARTICLES = RecordedParticles(np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3), dtype=np.float32),
+                                    np.zeros(0, dtype=np.float32))
+
+
+class ParticleRecorder:
+    # Streams the drawable state of every CPU layer after each manager update. Ticks are buffered into chunks,
+    # which are written as: per-tick step counts, per-tick-and-layer particle counts, then the position, step and
+    # size columns of every particle in the chunk, optionally zlib-compressed. The index and metadata go into a
+    # JSON footer when the recorder is closed.
+    def __init__(self, path, delta_t, precision='float32', compression=0, chunk_ticks=CHUNK_TICKS, metadata=None):
+        if precision not in PRECISIONS:
+            raise ValueError(f'unknown recording precision {precision!r}, expected one of {PRECISIONS}')
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.delta_t = delta_t
+        self.dtype = np.dtype(precision)
+        self.compression = compression
+        self.chunk_ticks = chunk_ticks
+        self.metadata = metadata or {}
+        self.layers = []
+        self.chunks = []
+        self.ticks = 0
+        self.step = 0
+        self.raw_bytes = 0
+        self.pending = []
+
+    def record(self, manager, steps=1):
+        for texture_path, layer in manager.layers.items():
+            if isinstance(layer.particles, GpuParticleStore):
+                raise ValueError('particles animated on the GPU cannot be recorded')
+            if texture_path not in self.layers:
+                self.layers.append(texture_path)
+
+        # Layers are numbered in the order they first appeared, so older chunks simply have fewer of them.
+        stores = [manager.layers[texture_path].particles for texture_path in self.layers]
+        self.pending.append((steps, [(particles.positions.astype(self.dtype),
+                                      (particles.positions - particles.previous_positions).astype(self.dtype),
+                                      particles.sizes.astype(self.dtype)) for particles in stores]))
+        self.ticks += 1
+        if len(self.pending) == self.chunk_ticks:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        layer_count = len(self.layers)
+        columns = [[], [], []]
+        counts = np.zeros((len(self.pending), layer_count), dtype=np.int32)
+        for tick, (_, layers) in enumerate(self.pending):
+            for layer, layer_columns in enumerate(layers):
+                counts[tick, layer] = len(layer_columns[2])
+                for column, values in zip(columns, layer_columns):
+                    column.append(values)
+
+        steps = np.array([steps for steps, _ in self.pending], dtype=np.int32)
+        raw = b''.join([steps.tobytes(), counts.tobytes()]
+                       + [np.concatenate(column).tobytes() if column else b'' for column in columns])
+        data = zlib.compress(raw, self.compression) if self.compression > 0 else raw
+
+        self.file.write(b'\0' * (-self.file.tell() % CHUNK_ALIGNMENT))
+        self.chunks.append([self.file.tell(), len(data), len(raw), self.ticks - len(self.pending), len(self.pending),
+                            self.step, layer_count])
+        self.file.write(data)
+        self.step += int(steps.sum())
+        self.raw_bytes += len(raw)
+        self.pending = []
+
+    def close(self):
+        if self.file is None:
+            return
+        self.flush()
+        footer = json.dumps({
+            'version': VERSION,
+            'delta_t': self.delta_t,
+            'precision': self.dtype.name,
+            'compression': self.compression,
+            'layers': self.layers,
+            'ticks': self.ticks,
+            'steps': self.step,
+            'raw_bytes': self.raw_bytes,
+            # Per chunk: file offset, stored size, raw size, first tick, tick count, first step, layer count.
+            'chunks': self.chunks,
+            'metadata': self.metadata,
+        }).encode()
+        self.file.write(footer)
+        self.file.write(TRAILER.pack(len(footer), MAGIC))
+        self.file.close()
+        self.file = None
+
+
+class ParticleRecording:
+    # Memory-mapped reader: any tick is found through the chunk index without touching the rest of the file, and
+    # uncompressed columns are read straight from the mapping without a copy.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.mmap, 0)
+        length, trailer_magic = TRAILER.unpack_from(self.mmap, len(self.mmap) - TRAILER.size)
+        if magic != MAGIC or trailer_magic != MAGIC:
+            raise ValueError(f'{path}: not a complete particle recording')
+        if version != VERSION:
+            raise ValueError(f'{path}: recording version {version}, expected {VERSION}')
+
+        footer_start = len(self.mmap) - TRAILER.size - length
+        self.info = json.loads(self.mmap[footer_start:footer_start + length])
+        self.delta_t = self.info['delta_t']
+        self.dtype = np.dtype(self.info['precision'])
+        self.layers = self.info['layers']
+        self.chunks = np.array(self.info['chunks'], dtype=np.int64).reshape(-1, 7)
+        self.cached_index = None
+        self.cached_chunk = None
+        if len(self) == 0:
+            # A recorder closed before its first update; there is no frame to show.
+            self.close()
+            raise ValueError(f'{path}: recording has no ticks')
+
+    def __len__(self):
+        return self.info['ticks']
+
+    @property
+    def steps(self):
+        return self.info['steps']
+
+    def read_chunk(self, index):
+        if index == self.cached_index:
+            return self.cached_chunk
+
+        offset, size, _, _, ticks, first_step, layer_count = self.chunks[index]
+        data = memoryview(self.mmap)[offset:offset + size]
+        if self.info['compression'] > 0:
+            data = zlib.decompress(data)
+
+        steps = np.frombuffer(data, dtype=np.int32, count=ticks)
+        counts = np.frombuffer(data, dtype=np.int32, count=ticks * layer_count, offset=steps.nbytes)
+        particle_count = int(counts.sum())
+        offset = steps.nbytes + counts.nbytes
+        columns = []
+        for components in (3, 3, 1):
+            column = np.frombuffer(data, dtype=self.dtype, count=particle_count * components, offset=offset)
+            columns.append(column.reshape(-1, 3) if components == 3 else column)
+            offset += column.nbytes
+
+        chunk = (first_step + np.cumsum(steps), counts.reshape(ticks, layer_count),
+                 np.cumsum(counts) - counts, columns)
+        self.cached_index = index
+        self.cached_chunk = chunk
+        return chunk
+
+    def get_frame(self, tick):
+        # One store-like object per layer; float16 columns are widened for the quad builders.
+        tick = min(max(tick, 0), len(self) - 1)
+        index = int(np.searchsorted(self.chunks[:, 3], tick, side='right')) - 1
+        _, counts, starts, (positions, steps, sizes) = self.read_chunk(index)
+        local = tick - int(self.chunks[index, 3])
+        layer_count = counts.shape[1]
+
+        frame = []
+        for layer in range(len(self.layers)):
+            if layer >= layer_count:
+                frame.append(EMPTY_PARTICLES)
+                continue
+            start = int(starts[local * layer_count + layer])
+            stop = start + int(counts[local, layer])
+            frame.append(RecordedParticles(positions[start:stop].astype(np.float32, copy=False),
+                                           steps[start:stop].astype(np.float32, copy=False),
+                                           sizes[start:stop].astype(np.float32, copy=False)))
+        return frame
+
+    def find_tick(self, step):
+        # The last tick recorded at or before the given simulation step, for playback at the recorded pace.
+        index = max(int(np.searchsorted(self.chunks[:, 5], step, side='right')) - 1, 0)
+        tick_steps = self.read_chunk(index)[0]
+        local = int(np.searchsorted(tick_steps, step, side='right')) - 1
+        return max(int(self.chunks[index, 3]) + local, 0)
+
+    def close(self):
+        self.cached_index = None
+        self.cached_chunk = None
+        try:
+            self.mmap.close()
+        except BufferError:
+            # Frames read from uncompressed chunks are views of the mapping; it goes away with the last of them.
+            pass
+        self.file.close()
+
+
+class ParticleReplay:
+    # Stands in for a ParticleManager when drawing: the same layers and renderers, fed from a recording instead of
+    # the simulation.
+    def __init__(self, recording, profiler=None):
+        self.recording = recording
+        self.profiler = profiler
+        self.layers = {texture_path: ParticleLayer(texture_path, EMPTY_PARTICLES, self.stage)
+                       for texture_path in recording.layers}
+        self.tick = -1
+        self.step = 0
+        self.seek(0)
+
+    def stage(self, name):
+        return self.profiler.stage(name) if self.profiler is not None else nullcontext()
+
+    def seek(self, tick):
+        tick = min(max(tick, 0), len(self.recording) - 1)
+        if tick == self.tick:
+            return
+        self.tick = tick
+        for layer, particles in zip(self.layers.values(), self.recording.get_frame(tick)):
+            layer.particles = particles
+
+    def seek_step(self, step):
+        self.step = min(max(step, 0), self.recording.steps)
+        self.seek(self.recording.find_tick(self.step))
+
+    def advance(self, steps):
+        self.seek_step(self.step + steps)
+
+    def draw(self, alpha=1.):
+        for layer in self.layers.values():
+            layer.draw(alpha)
+
+    def close(self):
+        for layer in self.layers.values():
+            layer.particles = EMPTY_PARTICLES
+        self.recording.close()
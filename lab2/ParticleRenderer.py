@@ -0,0 +1,81 @@
+from ctypes import byref, sizeof
+
+from pyglet.gl import *
+from pyglet.gl import gl_info
+import numpy as np
+
+from kernels import build_particle_quads
+from quads import VERTEX_COMPONENTS, VERTICES_PER_QUAD
+from utils import draw_particles
+
+VERTEX_STRIDE = VERTEX_COMPONENTS * sizeof(GLfloat)
+TEXCOORD_OFFSET = 3 * sizeof(GLfloat)
+
+
+def have_vertex_buffers():
+    return gl_info.have_version(1, 5)
+
+
+class ParticleRenderer:
+    def __init__(self, texture, stage):
+        self.texture = texture
+        self.stage = stage
+        self.vertices = np.zeros((0, VERTEX_COMPONENTS), dtype=np.float32)
+        self.buffer = None
+        self.buffer_size = 0
+
+        if have_vertex_buffers():
+            self.buffer = GLuint()
+            glGenBuffers(1, byref(self.buffer))
+
+    def reserve(self, count):
+        vertex_count = count * VERTICES_PER_QUAD
+        if len(self.vertices) < vertex_count:
+            capacity = max(vertex_count, 2 * len(self.vertices))
+            self.vertices = np.empty((capacity, VERTEX_COMPONENTS), dtype=np.float32)
+
+    def upload(self, vertices):
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        if self.buffer_size < self.vertices.nbytes:
+            self.buffer_size = self.vertices.nbytes
+        # Orphan the previous storage so the driver does not stall on the frame still using it.
+        glBufferData(GL_ARRAY_BUFFER, self.buffer_size, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices.ctypes.data)
+
+    def draw(self, particles, alpha=1.):
+        if self.buffer is None:
+            with self.stage('draw'):
+                draw_particles(self.texture, particles)
+            return
+
+        count = len(particles)
+        if count == 0:
+            return
+
+        with self.stage('buffer_build'):
+            self.reserve(count)
+            vertices = build_particle_quads(particles, alpha, self.vertices)
+            self.upload(vertices)
+
+        with self.stage('draw'):
+            self.draw_vertices(len(vertices))
+
+    def draw_vertices(self, vertex_count):
+        glEnable(self.texture.target)
+        glBindTexture(self.texture.target, self.texture.id)
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, 0)
+        glTexCoordPointer(2, GL_FLOAT, VERTEX_STRIDE, TEXCOORD_OFFSET)
+
+        glDrawArrays(GL_QUADS, 0, vertex_count)
+
+        glPopClientAttrib()
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisable(self.texture.target)
+
+    def delete(self):
+        if self.buffer is not None:
+            glDeleteBuffers(1, byref(self.buffer))
+            self.buffer = None
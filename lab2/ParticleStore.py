@@ -0,0 +1,169 @@
+import numpy as np
+
+from kernels import integrate_particles
+
+DEFAULT_CAPACITY = 4096
+
+BUFFER_LAYOUT = (
+    ('position_buffer', (3,), np.float64),
+    ('previous_position_buffer', (3,), np.float64),
+    ('velocity_buffer', (3,), np.float64),
+    ('size_buffer', (), np.float64),
+    ('creation_size_buffer', (), np.float64),
+    ('life_span_buffer', (), np.float64),
+    ('creation_life_span_buffer', (), np.float64),
+    ('min_size_ratio_buffer', (), np.float64),
+    ('emitter_buffer', (), np.int32),
+)
+
+
+class ParticleStore:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.count = 0
+
+        for name, shape, dtype in BUFFER_LAYOUT:
+            setattr(self, name, self.allocate(name, (capacity,) + shape, dtype))
+
+        self.peak_count = 0
+        self.spawned = 0
+        self.died = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def positions(self):
+        return self.position_buffer[:self.count]
+
+    @property
+    def previous_positions(self):
+        return self.previous_position_buffer[:self.count]
+
+    @property
+    def velocities(self):
+        return self.velocity_buffer[:self.count]
+
+    @property
+    def sizes(self):
+        return self.size_buffer[:self.count]
+
+    @property
+    def creation_sizes(self):
+        return self.creation_size_buffer[:self.count]
+
+    @property
+    def life_spans(self):
+        return self.life_span_buffer[:self.count]
+
+    @property
+    def creation_life_spans(self):
+        return self.creation_life_span_buffer[:self.count]
+
+    @property
+    def min_size_ratios(self):
+        return self.min_size_ratio_buffer[:self.count]
+
+    @property
+    def emitters(self):
+        return self.emitter_buffer[:self.count]
+
+    def allocate(self, name, shape, dtype):
+        return np.zeros(shape, dtype=dtype)
+
+    def release(self, name, buffer):
+        pass
+
+    def buffers(self):
+        return {name: getattr(self, name) for name, _, _ in BUFFER_LAYOUT}
+
+    def grow(self, capacity):
+        if capacity <= self.capacity:
+            return
+
+        for name, shape, dtype in BUFFER_LAYOUT:
+            buffer = getattr(self, name)
+            grown = self.allocate(name, (capacity,) + shape, dtype)
+            grown[:self.count] = buffer[:self.count]
+            setattr(self, name, grown)
+            self.release(name, buffer)
+        self.capacity = capacity
+
+    def free_slots(self):
+        return self.capacity - self.count
+
+    def add(self, positions, velocities, sizes, life_spans, emitter=0, min_size_ratio=1., age=0., last_delta_t=None):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        velocities = np.asarray(velocities, dtype=float).reshape(-1, 3)
+
+        requested = len(positions)
+        number = min(requested, self.free_slots())
+        self.dropped += requested - number
+        if number == 0:
+            return 0
+
+        start = self.count
+        end = start + number
+        self.position_buffer[start:end] = positions[:number]
+        self.previous_position_buffer[start:end] = positions[:number]
+        self.velocity_buffer[start:end] = velocities[:number]
+        self.size_buffer[start:end] = np.broadcast_to(sizes, requested)[:number]
+        self.creation_size_buffer[start:end] = self.size_buffer[start:end]
+        self.life_span_buffer[start:end] = np.broadcast_to(life_spans, requested)[:number]
+        self.creation_life_span_buffer[start:end] = self.life_span_buffer[start:end]
+        self.min_size_ratio_buffer[start:end] = min_size_ratio
+        self.emitter_buffer[start:end] = emitter
+
+        self.count = end
+        self.spawned += number
+        self.peak_count = max(self.peak_count, self.count)
+
+        if age > 0:
+            self.integrate(start, end, age, last_delta_t)
+        return number
+
+    def integrate(self, start, stop, delta_t, last_delta_t=None):
+        return integrate_particles(self.buffers(), start, stop, delta_t, last_delta_t)
+
+    def update(self, delta_t, last_delta_t=None):
+        if self.integrate(0, self.count, delta_t, last_delta_t):
+            self.remove_dead()
+
+    def remove_dead(self):
+        alive = self.life_spans > 0
+        survivors = int(np.count_nonzero(alive))
+        if survivors == self.count:
+            return
+
+        # Fill the holes left in the surviving prefix with the live particles from the tail,
+        # so only the dead slots are touched instead of shifting the whole pool.
+        holes = np.flatnonzero(~alive[:survivors])
+        movers = np.flatnonzero(alive[survivors:]) + survivors
+        for buffer in self.buffers().values():
+            buffer[holes] = buffer[movers]
+
+        self.died += self.count - survivors
+        self.count = survivors
+
+    def counts_by_emitter(self, emitter_count):
+        return np.bincount(self.emitters, minlength=emitter_count)
+
+    def clear(self):
+        self.died += self.count
+        self.count = 0
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'count': self.count,
+            'occupancy': self.count / self.capacity if self.capacity else 0.,
+            'peak_count': self.peak_count,
+            'peak_occupancy': self.peak_count / self.capacity if self.capacity else 0.,
+            'spawned': self.spawned,
+            'died': self.died,
+            'dropped': self.dropped,
+        }
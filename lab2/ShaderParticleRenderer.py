@@ -0,0 +1,162 @@
+from ctypes import byref, c_char_p, cast, create_string_buffer, pointer, sizeof, POINTER
+
+from pyglet.gl import *
+
+from GpuParticleStore import CORNER_OFFSET, ORIGIN_OFFSET, RECORD_COMPONENTS, TIMING_OFFSET, VELOCITY_OFFSET
+from quads import VERTICES_PER_QUAD
+
+RECORD_STRIDE = RECORD_COMPONENTS * sizeof(GLfloat)
+PARTICLE_SIZE = VERTICES_PER_QUAD * RECORD_STRIDE
+
+# GLSL 1.20 keeps the shaders usable on compatibility contexts such as Mesa's llvmpipe.
+VERTEX_SHADER = b'''
+#version 120
+
+uniform float time;
+
+attribute vec3 origin;
+attribute vec3 velocity;
+attribute vec2 corner;
+attribute vec4 timing;
+
+varying vec2 texcoord;
+
+void main() {
+    float frames = (time - timing.x) * 60.0;
+    float life_span = timing.y - frames;
+    float size = timing.z * max(life_span / timing.y, timing.w);
+
+    vec3 position = origin + velocity * frames;
+    position.xy += (corner * 2.0 - 1.0) * size * 0.5;
+
+    texcoord = corner;
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(position, 1.0);
+    if (life_span <= 0.0 || frames < 0.0) {
+        // Expired or unused slots collapse to a point outside the clip volume.
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+    }
+}
+'''
+
+FRAGMENT_SHADER = b'''
+#version 120
+
+uniform sampler2D particle_texture;
+
+varying vec2 texcoord;
+
+void main() {
+    gl_FragColor = texture2D(particle_texture, texcoord);
+}
+'''
+
+ATTRIBUTES = (
+    ('origin', 3, ORIGIN_OFFSET),
+    ('velocity', 3, VELOCITY_OFFSET),
+    ('corner', 2, CORNER_OFFSET),
+    ('timing', 4, TIMING_OFFSET),
+)
+
+
+def compile_shader(shader_type, source):
+    shader = glCreateShader(shader_type)
+    source_pointer = c_char_p(source)
+    glShaderSource(shader, 1, cast(pointer(source_pointer), POINTER(POINTER(GLchar))), None)
+    glCompileShader(shader)
+
+    status = GLint()
+    glGetShaderiv(shader, GL_COMPILE_STATUS, byref(status))
+    if not status.value:
+        log = create_string_buffer(4096)
+        glGetShaderInfoLog(shader, len(log), None, log)
+        raise RuntimeError(f'particle shader failed to compile: {log.value.decode()}')
+    return shader
+
+
+def link_program(vertex_source, fragment_source):
+    program = glCreateProgram()
+    shaders = [compile_shader(GL_VERTEX_SHADER, vertex_source), compile_shader(GL_FRAGMENT_SHADER, fragment_source)]
+    for shader in shaders:
+        glAttachShader(program, shader)
+    for location, (name, _, _) in enumerate(ATTRIBUTES):
+        glBindAttribLocation(program, location, name.encode())
+    glLinkProgram(program)
+
+    status = GLint()
+    glGetProgramiv(program, GL_LINK_STATUS, byref(status))
+    if not status.value:
+        log = create_string_buffer(4096)
+        glGetProgramInfoLog(program, len(log), None, log)
+        raise RuntimeError(f'particle shader failed to link: {log.value.decode()}')
+
+    for shader in shaders:
+        glDeleteShader(shader)
+    return program
+
+
+class ShaderParticleRenderer:
+    def __init__(self, texture, stage):
+        self.texture = texture
+        self.stage = stage
+        self.program = link_program(VERTEX_SHADER, FRAGMENT_SHADER)
+        self.time_location = glGetUniformLocation(self.program, b'time')
+        self.texture_location = glGetUniformLocation(self.program, b'particle_texture')
+
+        self.buffer = GLuint()
+        glGenBuffers(1, byref(self.buffer))
+        self.capacity = 0
+
+    def reserve(self, capacity):
+        if capacity == self.capacity:
+            return
+
+        # Zeroed records have a zero life span, so every slot starts out expired.
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glBufferData(GL_ARRAY_BUFFER, capacity * PARTICLE_SIZE, (GLubyte * (capacity * PARTICLE_SIZE))(),
+                     GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.capacity = capacity
+
+    def upload(self, particles):
+        self.reserve(particles.capacity)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        for slot, records in particles.take_pending():
+            glBufferSubData(GL_ARRAY_BUFFER, slot * PARTICLE_SIZE, records.nbytes, records.ctypes.data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, particles, time):
+        with self.stage('buffer_build'):
+            self.upload(particles)
+
+        count = particles.drawn_count()
+        if count == 0:
+            return
+
+        with self.stage('draw'):
+            self.draw_records(count, time)
+
+    def draw_records(self, count, time):
+        glEnable(self.texture.target)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(self.texture.target, self.texture.id)
+        glUseProgram(self.program)
+        glUniform1f(self.time_location, time)
+        glUniform1i(self.texture_location, 0)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        for location, (_, size, offset) in enumerate(ATTRIBUTES):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, RECORD_STRIDE, offset * sizeof(GLfloat))
+
+        glDrawArrays(GL_QUADS, 0, count * VERTICES_PER_QUAD)
+
+        for location in range(len(ATTRIBUTES)):
+            glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+        glDisable(self.texture.target)
+
+    def delete(self):
+        glDeleteBuffers(1, byref(self.buffer))
+        glDeleteProgram(self.program)
@@ -0,0 +1,88 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import kernels
+from ParticleStore import ParticleStore
+
+MIN_SHARD_SIZE = 25000
+
+_attached_blocks = {}
+
+
+def _attach(block_name, shape, dtype):
+    if block_name not in _attached_blocks:
+        _attached_blocks[block_name] = shared_memory.SharedMemory(name=block_name)
+    return np.ndarray(shape, dtype=dtype, buffer=_attached_blocks[block_name].buf)
+
+
+def _integrate_shard(layout, retired_names, start, stop, delta_t, last_delta_t, backend):
+    # Only blocks a grown pool has replaced are dropped; other stores sharing the workers keep their attachments.
+    for block_name in retired_names:
+        if block_name in _attached_blocks:
+            _attached_blocks.pop(block_name).close()
+
+    buffers = {name: _attach(block_name, shape, dtype) for name, (block_name, shape, dtype) in layout.items()}
+    kernels.set_backend(backend)
+    return kernels.integrate_particles(buffers, start, stop, delta_t, last_delta_t)
+
+
+def create_worker_pool(workers):
+    return ProcessPoolExecutor(workers)
+
+
+class SharedParticleStore(ParticleStore):
+    def __init__(self, capacity, pool, workers):
+        self.pool = pool
+        self.workers = workers
+        self.blocks = {}
+        self.retired_blocks = []
+        # Every block name this store has retired; a shard may run on a worker that missed earlier ones.
+        self.retired_names = []
+
+        super().__init__(capacity)
+
+    def allocate(self, name, shape, dtype):
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        if name in self.blocks:
+            self.retired_blocks.append(self.blocks[name])
+            self.retired_names.append(self.blocks[name].name)
+        self.blocks[name] = block
+
+        buffer = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        buffer.fill(0)
+        return buffer
+
+    def release(self, name, buffer):
+        # grow() still holds the old array, so the block it just retired is unlinked now and closed in close().
+        self.retired_blocks[-1].unlink()
+
+    def layout(self):
+        return {name: (self.blocks[name].name, buffer.shape, buffer.dtype.str)
+                for name, buffer in self.buffers().items()}
+
+    def integrate(self, start, stop, delta_t, last_delta_t=None):
+        shards = min(self.workers, (stop - start) // MIN_SHARD_SIZE)
+        if shards < 2:
+            return super().integrate(start, stop, delta_t, last_delta_t)
+
+        layout = self.layout()
+        bounds = np.linspace(start, stop, shards + 1).astype(int)
+        futures = [self.pool.submit(_integrate_shard, layout, self.retired_names, int(shard_start), int(shard_stop),
+                                    delta_t, last_delta_t, kernels.backend)
+                   for shard_start, shard_stop in zip(bounds[:-1], bounds[1:])]
+        return sum(future.result() for future in futures)
+
+    def close(self):
+        for name in self.buffers():
+            setattr(self, name, None)
+
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        for block in self.retired_blocks:
+            block.close()
+        self.blocks = {}
+        self.retired_blocks = []
@@ -0,0 +1,197 @@
+import numpy as np
+
+import kernels
+
+# Cells are found through a dense table over the occupied bounding box while it has at most this many cells per
+# particle, up to MAX_TABLE_CELLS; sparser boxes fall back to a binary search of the sorted cell keys.
+TABLE_CELLS_PER_PARTICLE = 64
+MIN_TABLE_CELLS = 1 << 16
+MAX_TABLE_CELLS = 1 << 24
+# Half of the 26 neighbouring cells; with the cell itself every pair of cells is visited exactly once.
+HALF_NEIGHBOURHOOD = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                               if (dx, dy, dz) > (0, 0, 0)])
+NEIGHBOURHOOD = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)])
+BRUTE_FORCE_BLOCK = 512
+INITIAL_PAIR_CAPACITY = 1 << 12
+
+
+def expand_ranges(starts, counts):
+    # Concatenation of arange(start, start + count) for every range, without a Python loop.
+    total = int(counts.sum())
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(total) - offsets
+
+
+def cross_ranges(first_starts, first_counts, second_starts, second_counts):
+    # Every (i, j) with i from the first range and j from the second, for each pair of ranges.
+    products = first_counts * second_counts
+    total = int(products.sum())
+    local = np.arange(total) - np.repeat(np.cumsum(products) - products, products)
+    widths = np.repeat(second_counts, products)
+    return np.repeat(first_starts, products) + local // widths, np.repeat(second_starts, products) + local % widths
+
+
+class SpatialHash:
+    # A uniform grid over the particles, rebuilt from scratch each tick: cell keys are sorted once and every
+    # occupied cell becomes a contiguous run of the sort order. The cell size must be at least the largest
+    # interaction distance, so only neighbouring cells have to be searched.
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.positions = np.zeros((0, 3))
+        self.order = np.zeros(0, dtype=np.int64)
+        self.cell_keys = np.zeros(0, dtype=np.int64)
+        self.cell_starts = np.zeros(0, dtype=np.int64)
+        self.cell_counts = np.zeros(0, dtype=np.int64)
+        # Keys number the cells of the occupied bounding box, padded by one cell so neighbours never fall outside.
+        self.low = np.zeros(3, dtype=np.int64)
+        self.shape = np.ones(3, dtype=np.int64)
+        self.strides = np.ones(3, dtype=np.int64)
+        # Dense cell-to-run table, kept between builds; only the entries written last time are cleared.
+        self.table = np.zeros(0, dtype=np.int32)
+        self.use_table = False
+        self.first_pairs = np.zeros(INITIAL_PAIR_CAPACITY, dtype=np.int64)
+        self.second_pairs = np.zeros(INITIAL_PAIR_CAPACITY, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.order)
+
+    def get_cells(self, positions):
+        return np.floor(positions / self.cell_size).astype(np.int64)
+
+    def build(self, positions, cell_size=None):
+        if cell_size is not None:
+            self.cell_size = cell_size
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        if self.use_table:
+            self.table[self.cell_keys] = -1
+        self.use_table = False
+        if len(self.positions) == 0:
+            self.order = self.cell_keys = self.cell_starts = self.cell_counts = np.zeros(0, dtype=np.int64)
+            return self
+
+        cells = self.get_cells(self.positions)
+        # Per-column reductions; reducing the (n, 3) array along axis 0 is several times slower.
+        self.low = np.array([cells[:, axis].min() for axis in range(3)]) - 1
+        self.shape = np.array([cells[:, axis].max() for axis in range(3)]) - self.low + 2
+        self.strides = np.array([self.shape[1] * self.shape[2], self.shape[2], 1])
+        cells -= self.low
+        keys = cells[:, 0] * self.strides[0] + cells[:, 1] * self.strides[1] + cells[:, 2]
+        cell_count = int(np.prod(self.shape))
+        if cell_count <= np.iinfo(np.int32).max:
+            # Narrower keys sort markedly faster.
+            keys = keys.astype(np.int32)
+
+        self.order = np.argsort(keys)
+        sorted_keys = keys[self.order]
+        self.cell_starts = np.flatnonzero(np.diff(sorted_keys, prepend=-1))
+        self.cell_keys = sorted_keys[self.cell_starts]
+        self.cell_counts = np.diff(self.cell_starts, append=len(sorted_keys))
+
+        if cell_count <= min(max(TABLE_CELLS_PER_PARTICLE * len(keys), MIN_TABLE_CELLS), MAX_TABLE_CELLS):
+            if len(self.table) < cell_count:
+                self.table = np.full(cell_count, -1, dtype=np.int32)
+            self.table[self.cell_keys] = np.arange(len(self.cell_keys), dtype=np.int32)
+            self.use_table = True
+        return self
+
+    def find_cells(self, keys):
+        # Index of each key in cell_keys, or -1 for empty cells.
+        if self.use_table:
+            return self.table[keys]
+        slots = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+        return np.where(self.cell_keys[slots] == keys, slots, -1)
+
+    def get_offset_keys(self, offsets):
+        return offsets[:, 0] * self.strides[0] + offsets[:, 1] * self.strides[1] + offsets[:, 2]
+
+    def find_pairs(self, radii):
+        # Pairs of particles whose spheres overlap, distance below radii[i] + radii[j], each pair once.
+        if len(self.cell_keys) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # Candidates are tested in sort order, where cell members are contiguous, and in single precision;
+        # only the survivors are mapped back to particle indices.
+        positions = self.positions[self.order].astype(np.float32)
+        radii = np.broadcast_to(radii, len(self.positions))[self.order].astype(np.float32)
+        if kernels.backend == 'numba':
+            return self.find_pairs_numba(positions, radii)
+
+        def touching(first, second):
+            offsets = positions[second] - positions[first]
+            reach = radii[first] + radii[second]
+            near = np.einsum('ij,ij->i', offsets, offsets) < reach * reach
+            return first[near], second[near]
+
+        shared = np.flatnonzero(self.cell_counts > 1)
+        first, second = cross_ranges(self.cell_starts[shared], self.cell_counts[shared],
+                                     self.cell_starts[shared], self.cell_counts[shared])
+        inside = first < second
+        first_inside, second_inside = touching(first[inside], second[inside])
+
+        # Every occupied cell against its half neighbourhood in one batch.
+        neighbours = self.find_cells(self.cell_keys[:, None] + self.get_offset_keys(HALF_NEIGHBOURHOOD)[None, :])
+        cells, slots = np.nonzero(neighbours >= 0)
+        neighbours = neighbours[cells, slots]
+        first, second = touching(*cross_ranges(self.cell_starts[cells], self.cell_counts[cells],
+                                               self.cell_starts[neighbours], self.cell_counts[neighbours]))
+
+        return self.order[np.concatenate((first_inside, first))], self.order[np.concatenate((second_inside, second))]
+
+    def find_pairs_numba(self, positions, radii):
+        # The compiled kernel walks cells and their neighbours directly, so no candidate array is ever built.
+        offset_keys = self.get_offset_keys(HALF_NEIGHBOURHOOD)
+        cell_keys = self.cell_keys.astype(np.int64)
+        while True:
+            count = kernels.find_touching_pairs_numba(positions, radii, cell_keys, self.cell_starts, self.cell_counts,
+                                                      self.table if self.use_table else self.table[:0], offset_keys,
+                                                      self.first_pairs, self.second_pairs)
+            if count <= len(self.first_pairs):
+                break
+            self.first_pairs = np.zeros(2 * count, dtype=np.int64)
+            self.second_pairs = np.zeros(2 * count, dtype=np.int64)
+        return self.order[self.first_pairs[:count]], self.order[self.second_pairs[:count]]
+
+    def query(self, points, radius):
+        # (point index, particle index) for every particle within radius of a point; radius up to the cell size.
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if len(self.cell_keys) == 0 or len(points) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # Points outside the padded box have no occupied neighbours; they are clamped to its border, which is empty.
+        point_cells = self.get_cells(points) - self.low
+        inside = np.all((point_cells >= 0) & (point_cells < self.shape), axis=1)
+        point_cells = np.clip(point_cells, 0, self.shape - 1)
+        keys = (point_cells[:, 0] * self.strides[0] + point_cells[:, 1] * self.strides[1]
+                + point_cells[:, 2])[:, None] + self.get_offset_keys(NEIGHBOURHOOD)[None, :]
+        cells = np.where(inside[:, None], self.find_cells(np.clip(keys, 0, int(np.prod(self.shape)) - 1)), -1)
+        cells = cells.reshape(-1)
+        found = cells >= 0
+        point_indices = np.repeat(np.arange(len(points)), len(NEIGHBOURHOOD))[found]
+
+        counts = self.cell_counts[cells[found]]
+        members = self.order[expand_ranges(self.cell_starts[cells[found]], counts)]
+        point_indices = np.repeat(point_indices, counts)
+
+        offsets = self.positions[members] - points[point_indices]
+        near = np.einsum('ij,ij->i', offsets, offsets) <= radius * radius
+        return point_indices[near], members[near]
+
+
+def find_pairs_brute_force(positions, radii):
+    # O(n^2) reference for the spatial hash, in row blocks to bound memory.
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    radii = np.broadcast_to(radii, len(positions))
+    firsts = []
+    seconds = []
+    for start in range(0, len(positions), BRUTE_FORCE_BLOCK):
+        stop = min(start + BRUTE_FORCE_BLOCK, len(positions))
+        offsets = positions[None, :, :] - positions[start:stop, None, :]
+        distances = np.einsum('ijk,ijk->ij', offsets, offsets)
+        reach = radii[start:stop, None] + radii[None, :]
+        first, second = np.nonzero((distances < reach * reach)
+                                   & (np.arange(len(positions))[None, :] > np.arange(start, stop)[:, None]))
+        firsts.append(first + start)
+        seconds.append(second)
+    if not firsts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(firsts), np.concatenate(seconds)
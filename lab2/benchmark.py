@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from BalloonParticleSystem import BalloonParticleSystem
+from ExplosionParticleSystem import ExplosionParticleSystem, POOL_CAPACITY
+from ForceField import RadialBlast, create_balloon_forces, create_debris_forces
+from ParticleInteractions import ParticleInteractions
+from ParticleManager import ParticleManager
+from ParticleRecording import PRECISIONS, ParticleRecorder, ParticleRecording
+from SpatialHash import SpatialHash, find_pairs_brute_force
+import kernels
+
+DEFAULT_COUNTS = [100, 1000, 10000, 100000, 1000000]
+DELTA_T = 1 / 60
+FIREWORK_COUNT = 24
+BROAD_PHASE_COUNTS = [1000, 10000, 50000]
+# Above this many particles the O(n^2) reference takes too long to be worth running.
+BRUTE_FORCE_LIMIT = 10000
+SCENE_LOW = (-3500, -3500, -750)
+SCENE_HIGH = (3500, 3500, 750)
+REPLAY_SEEKS = 100
+
+
+def make_balloon_scene(manager, count, rng, forces=False):
+    system = BalloonParticleSystem(count, manager=manager, rng=rng,
+                                   forces=create_balloon_forces(RadialBlast()) if forces else None)
+    system.create_new_particles(count - system.live_count())
+
+
+def make_explosion_scene(manager, count, rng, forces=False):
+    system = ExplosionParticleSystem(capacity=count + POOL_CAPACITY, manager=manager, rng=rng,
+                                     forces=create_debris_forces() if forces else None, burst_size=count)
+    system.create_explosion()
+
+
+def make_fireworks_scene(manager, count, rng, forces=False):
+    # With forces, every firework shoves the balloons, so the blast stage runs at the scene's full burst rate.
+    blast = RadialBlast() if forces else None
+    BalloonParticleSystem(count // 2, spawn_rate=count // 2, manager=manager, rng=rng,
+                          forces=create_balloon_forces(blast) if forces else None)
+    debris_forces = create_debris_forces() if forces else None
+    for i in range(FIREWORK_COUNT):
+        firework = ExplosionParticleSystem(capacity=count // FIREWORK_COUNT + POOL_CAPACITY, manager=manager, rng=rng,
+                                           forces=debris_forces, blast=blast, burst_size=count // 2 // FIREWORK_COUNT)
+        firework.timer = i * firework.interval / FIREWORK_COUNT
+        firework.create_explosion()
+
+
+SCENES = {
+    'balloon': make_balloon_scene,
+    'explosion': make_explosion_scene,
+    'fireworks': make_fireworks_scene,
+}
+
+
+def run_benchmark(name, count, ticks, seed, workers=0, backend=kernels.backend, interactions=False, forces=False,
+                  recorder=None):
+    kernels.set_backend(backend)
+    kernels.warm_up()
+    rng = np.random.default_rng(seed)
+
+    tracemalloc.start()
+    manager = ParticleManager(workers, interactions=ParticleInteractions() if interactions else None)
+    SCENES[name](manager, count, rng, forces)
+    vertices = []
+
+    update_time = 0.
+    build_time = 0.
+    particle_ticks = 0
+    for _ in range(ticks):
+        particle_ticks += len(manager)
+
+        start = time.perf_counter()
+        manager.update(DELTA_T)
+        update_time += time.perf_counter() - start
+        if recorder is not None:
+            recorder.record(manager)
+
+        start = time.perf_counter()
+        vertices = [kernels.build_particle_quads(layer.particles, 0.5) for layer in manager.layers.values()]
+        build_time += time.perf_counter() - start
+
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del vertices
+    stats = manager.stats()
+    manager.close()
+
+    return {
+        'scene': name,
+        'count': count,
+        'workers': workers,
+        'kernels': backend,
+        'ticks': ticks,
+        'mean_live_particles': particle_ticks / ticks,
+        'ticks_per_second': ticks / update_time if update_time else float('inf'),
+        'ns_per_particle': update_time / particle_ticks * 1e9 if particle_ticks else 0.,
+        'buffer_build_ms': build_time / ticks * 1e3,
+        'peak_memory_bytes': peak_memory,
+        'emitters': len(manager.emitters),
+        'interactions': manager.interactions.stats() if manager.interactions is not None else None,
+        # Per force stage, plus gathering the particles of emitters that share stages.
+        'force_ms': {stage: seconds / ticks * 1e3 for stage, seconds in manager.forces.stats().items()},
+        'pools': stats,
+    }
+
+
+def run_broad_phase_benchmark(count, radius, repeats, seed, backend=kernels.backend):
+    # Particles spread over the scene volume with radii between radius / 2 and radius.
+    kernels.set_backend(backend)
+    kernels.warm_up()
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(SCENE_LOW, SCENE_HIGH, (count, 3))
+    radii = rng.uniform(radius / 2, radius, count)
+
+    grid = SpatialHash(2 * radius)
+    build_time = 0.
+    find_time = 0.
+    for _ in range(repeats):
+        start = time.perf_counter()
+        grid.build(positions)
+        build_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        first, second = grid.find_pairs(radii)
+        find_time += time.perf_counter() - start
+
+    result = {
+        'count': count,
+        'radius': radius,
+        'kernels': backend,
+        'cells': len(grid.cell_keys),
+        'pairs': len(first),
+        'build_ms': build_time / repeats * 1e3,
+        'find_ms': find_time / repeats * 1e3,
+        'brute_force_ms': None,
+        'matches_brute_force': None,
+    }
+    if count <= BRUTE_FORCE_LIMIT:
+        start = time.perf_counter()
+        expected_first, expected_second = find_pairs_brute_force(positions, radii)
+        result['brute_force_ms'] = (time.perf_counter() - start) * 1e3
+        pairs = np.sort(np.stack((first, second), axis=1), axis=1)
+        expected = np.stack((expected_first, expected_second), axis=1)
+        result['matches_brute_force'] = len(pairs) == len(expected) and bool(
+            np.array_equal(np.unique(pairs, axis=0), np.unique(expected, axis=0)))
+    return result
+
+
+def run_replay_benchmark(path, seeks, seed, backend=kernels.backend):
+    # Render cost in isolation: every recorded tick is read from the mapping and built into quads, with no
+    # simulation, followed by reads at random ticks as when scrubbing. Recordings without ticks are rejected on open.
+    kernels.set_backend(backend)
+    kernels.warm_up()
+    recording = ParticleRecording(path)
+    vertices = []
+
+    read_time = 0.
+    build_time = 0.
+    particle_ticks = 0
+    for tick in range(len(recording)):
+        start = time.perf_counter()
+        frame = recording.get_frame(tick)
+        read_time += time.perf_counter() - start
+        particle_ticks += sum(len(particles) for particles in frame)
+
+        start = time.perf_counter()
+        vertices = [kernels.build_particle_quads(particles, 0.5) for particles in frame]
+        build_time += time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    seek_times = []
+    for tick in rng.integers(len(recording), size=seeks):
+        start = time.perf_counter()
+        vertices = [kernels.build_particle_quads(particles, 0.5) for particles in recording.get_frame(tick)]
+        seek_times.append(time.perf_counter() - start)
+    del frame, vertices
+
+    ticks = len(recording)
+    result = {
+        'recording': path,
+        'kernels': backend,
+        'ticks': len(recording),
+        'precision': recording.info['precision'],
+        'compression': recording.info['compression'],
+        'file_bytes': os.path.getsize(path),
+        'raw_bytes': recording.info['raw_bytes'],
+        'mean_live_particles': particle_ticks / ticks,
+        'read_ms': read_time / ticks * 1e3,
+        'buffer_build_ms': build_time / ticks * 1e3,
+        'seek_ms': np.percentile(seek_times, [50, 99]).tolist() if seek_times else None,
+    }
+    recording.close()
+    return result
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Headless particle scene benchmark.')
+    parser.add_argument('--scenes', nargs='+', choices=sorted(SCENES), default=sorted(SCENES))
+    parser.add_argument('--counts', nargs='+', type=int, default=DEFAULT_COUNTS)
+    parser.add_argument('--ticks', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', nargs='+', type=int, default=[0],
+                        help='worker process counts for the shared-memory backend (0 runs in-process)')
+    parser.add_argument('--kernels', nargs='+', choices=kernels.BACKENDS, default=[kernels.backend])
+    parser.add_argument('--interactions', action='store_true', help='resolve particle collisions every tick')
+    parser.add_argument('--forces', action='store_true', help='run the force stages on every emitter')
+    parser.add_argument('--broad-phase', action='store_true',
+                        help='also time the spatial hash pair search against brute force')
+    parser.add_argument('--broad-phase-counts', nargs='+', type=int, default=BROAD_PHASE_COUNTS)
+    parser.add_argument('--broad-phase-radius', type=float, default=20.)
+    parser.add_argument('--record', help='record every run to this file; {scene}, {count}, {workers} and {kernels} '
+                                         'are replaced by the run\'s settings')
+    parser.add_argument('--record-precision', choices=PRECISIONS, default=PRECISIONS[0])
+    parser.add_argument('--record-compression', type=int, default=0, choices=range(10), metavar='LEVEL')
+    parser.add_argument('--replay', nargs='+', default=[],
+                        help='recordings to replay without simulating, timing only reading and buffer building')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+
+    results = []
+    for name in arguments.scenes:
+        for count in arguments.counts:
+            for workers in arguments.workers:
+                for backend in arguments.kernels:
+                    recorder = None
+                    if arguments.record:
+                        recorder = ParticleRecorder(arguments.record.format(scene=name, count=count, workers=workers,
+                                                                            kernels=backend),
+                                                    DELTA_T, arguments.record_precision, arguments.record_compression,
+                                                    metadata={'scene': name, 'count': count, 'seed': arguments.seed})
+                    results.append(run_benchmark(name, count, arguments.ticks, arguments.seed, workers, backend,
+                                                 arguments.interactions, arguments.forces, recorder))
+                    if recorder is not None:
+                        recorder.close()
+                    print(f'{name} {count} x{workers} {backend}: {results[-1]["ticks_per_second"]:.1f} ticks/s',
+                          file=sys.stderr)
+
+    broad_phase = []
+    if arguments.broad_phase:
+        for count in arguments.broad_phase_counts:
+            for backend in arguments.kernels:
+                broad_phase.append(run_broad_phase_benchmark(count, arguments.broad_phase_radius, arguments.ticks,
+                                                             arguments.seed, backend))
+                print(f'broad phase {count} {backend}: '
+                      f'{broad_phase[-1]["build_ms"] + broad_phase[-1]["find_ms"]:.1f} ms', file=sys.stderr)
+
+    replays = []
+    for path in arguments.replay:
+        for backend in arguments.kernels:
+            replays.append(run_replay_benchmark(path, REPLAY_SEEKS, arguments.seed, backend))
+            print(f'replay {path} {backend}: {replays[-1]["buffer_build_ms"]:.2f} ms per tick', file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': arguments.seed,
+        'delta_t': DELTA_T,
+        'results': results,
+        'broad_phase': broad_phase,
+        'replays': replays,
+    }
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
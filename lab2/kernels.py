@@ -0,0 +1,262 @@
+import os
+
+import numpy as np
+
+from quads import build_quad_vertices, QUAD_CORNERS, QUAD_TEXCOORDS, VERTEX_COMPONENTS, VERTICES_PER_QUAD
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+HAVE_NUMBA = njit is not None
+BACKENDS = ('numba', 'numpy') if HAVE_NUMBA else ('numpy',)
+
+backend = None
+
+
+def set_backend(name):
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f'unknown or unavailable particle kernel backend {name!r}, expected one of {BACKENDS}')
+    backend = name
+
+
+def integrate_particles_numpy(buffers, start, stop, frames, last_frames):
+    positions = buffers['position_buffer'][start:stop]
+    velocities = buffers['velocity_buffer'][start:stop]
+    life_spans = buffers['life_span_buffer'][start:stop]
+
+    # Keep the state one step before the end so the renderer can interpolate towards it.
+    previous_positions = buffers['previous_position_buffer'][start:stop]
+    np.multiply(velocities, frames - last_frames, out=previous_positions)
+    previous_positions += positions
+    positions += velocities * frames
+    life_spans -= frames
+
+    ratio = life_spans / buffers['creation_life_span_buffer'][start:stop]
+    np.maximum(ratio, buffers['min_size_ratio_buffer'][start:stop], out=ratio)
+    np.multiply(buffers['creation_size_buffer'][start:stop], ratio, out=buffers['size_buffer'][start:stop])
+
+    return int(np.count_nonzero(life_spans <= 0))
+
+
+def resolve_contacts_numpy(positions, velocities, radii, first, second):
+    # Equal masses: each particle is pushed out by half the overlap, and approaching particles swap the velocity
+    # components along the contact normal, which is a perfectly elastic bounce. A particle in several contacts
+    # gets the average of their responses; summing them would pump energy into crowded clusters.
+    offsets = positions[second] - positions[first]
+    distances = np.sqrt(np.einsum('ij,ij->i', offsets, offsets))
+    coincident = distances == 0
+    offsets[coincident] = (1., 0., 0.)
+    distances[coincident] = 1.
+    normals = offsets / distances[:, None]
+
+    contacts = np.maximum(np.bincount(first, minlength=len(positions))
+                          + np.bincount(second, minlength=len(positions)), 1)
+
+    def scatter(values):
+        # Per-component bincount is much faster than np.add.at for the same sums.
+        totals = np.empty_like(positions)
+        for axis in range(3):
+            totals[:, axis] = (np.bincount(second, values[:, axis], len(positions))
+                               - np.bincount(first, values[:, axis], len(positions)))
+        return totals / contacts[:, None]
+
+    corrections = scatter(normals * ((radii[first] + radii[second] - distances) / 2)[:, None])
+    approach = np.einsum('ij,ij->i', velocities[second] - velocities[first], normals)
+    exchanged = scatter(normals * -np.minimum(approach, 0)[:, None])
+    return corrections, exchanged
+
+
+def build_particle_quads_numpy(positions, previous_positions, sizes, alpha, out):
+    if alpha < 1:
+        positions = previous_positions + (positions - previous_positions) * alpha
+    return build_quad_vertices(positions, sizes, out)
+
+
+if HAVE_NUMBA:
+    @njit(cache=True)
+    def _integrate_numba(positions, previous_positions, velocities, sizes, creation_sizes, life_spans,
+                         creation_life_spans, min_size_ratios, frames, last_frames):
+        dead = 0
+        for i in range(len(life_spans)):
+            for axis in range(3):
+                position = positions[i, axis]
+                velocity = velocities[i, axis]
+                previous_positions[i, axis] = position + velocity * (frames - last_frames)
+                positions[i, axis] = position + velocity * frames
+
+            life_span = life_spans[i] - frames
+            life_spans[i] = life_span
+            ratio = max(life_span / creation_life_spans[i], min_size_ratios[i])
+            sizes[i] = creation_sizes[i] * ratio
+
+            if life_span <= 0:
+                dead += 1
+        return dead
+
+    @njit(cache=True)
+    def _build_quads_numba(positions, previous_positions, sizes, alpha, corners, texcoords, out):
+        for i in range(len(sizes)):
+            x = previous_positions[i, 0] + (positions[i, 0] - previous_positions[i, 0]) * alpha
+            y = previous_positions[i, 1] + (positions[i, 1] - previous_positions[i, 1]) * alpha
+            z = previous_positions[i, 2] + (positions[i, 2] - previous_positions[i, 2]) * alpha
+            half_size = sizes[i] / 2
+            for corner in range(4):
+                vertex = out[i * 4 + corner]
+                vertex[0] = x + corners[corner, 0] * half_size
+                vertex[1] = y + corners[corner, 1] * half_size
+                vertex[2] = z
+                vertex[3] = texcoords[corner, 0]
+                vertex[4] = texcoords[corner, 1]
+
+    @njit(cache=True)
+    def _find_touching_pairs_numba(positions, radii, cell_keys, cell_starts, cell_counts, table, offset_keys,
+                                   first, second):
+        # Pairs past the end of the output are only counted, so the caller can grow it and search again.
+        # Without a table, neighbouring cells are found by binary search of the sorted keys.
+        count = 0
+        for cell in range(len(cell_keys)):
+            start = cell_starts[cell]
+            stop = start + cell_counts[cell]
+            for slot in range(-1, len(offset_keys)):
+                if slot < 0:
+                    other = cell
+                elif len(table) > 0:
+                    other = table[cell_keys[cell] + offset_keys[slot]]
+                    if other < 0:
+                        continue
+                else:
+                    key = cell_keys[cell] + offset_keys[slot]
+                    other = np.searchsorted(cell_keys, key)
+                    if other == len(cell_keys) or cell_keys[other] != key:
+                        continue
+                other_stop = cell_starts[other] + cell_counts[other]
+                for i in range(start, stop):
+                    for j in range(i + 1 if slot < 0 else cell_starts[other], other_stop):
+                        dx = positions[j, 0] - positions[i, 0]
+                        dy = positions[j, 1] - positions[i, 1]
+                        dz = positions[j, 2] - positions[i, 2]
+                        reach = radii[i] + radii[j]
+                        if dx * dx + dy * dy + dz * dz < reach * reach:
+                            if count < len(first):
+                                first[count] = i
+                                second[count] = j
+                            count += 1
+        return count
+
+    @njit(cache=True)
+    def _resolve_contacts_numba(positions, velocities, radii, first, second, corrections, exchanged):
+        contacts = np.zeros(len(positions))
+        for pair in range(len(first)):
+            i = first[pair]
+            j = second[pair]
+            nx = positions[j, 0] - positions[i, 0]
+            ny = positions[j, 1] - positions[i, 1]
+            nz = positions[j, 2] - positions[i, 2]
+            distance = np.sqrt(nx * nx + ny * ny + nz * nz)
+            if distance == 0:
+                nx, ny, nz, distance = 1., 0., 0., 1.
+            nx /= distance
+            ny /= distance
+            nz /= distance
+
+            push = (radii[i] + radii[j] - distance) / 2
+            approach = ((velocities[j, 0] - velocities[i, 0]) * nx + (velocities[j, 1] - velocities[i, 1]) * ny
+                        + (velocities[j, 2] - velocities[i, 2]) * nz)
+            impulse = -min(approach, 0.)
+            corrections[i, 0] -= nx * push
+            corrections[i, 1] -= ny * push
+            corrections[i, 2] -= nz * push
+            corrections[j, 0] += nx * push
+            corrections[j, 1] += ny * push
+            corrections[j, 2] += nz * push
+            exchanged[i, 0] -= nx * impulse
+            exchanged[i, 1] -= ny * impulse
+            exchanged[i, 2] -= nz * impulse
+            exchanged[j, 0] += nx * impulse
+            exchanged[j, 1] += ny * impulse
+            exchanged[j, 2] += nz * impulse
+            contacts[i] += 1
+            contacts[j] += 1
+
+        for i in range(len(positions)):
+            if contacts[i] > 1:
+                for axis in range(3):
+                    corrections[i, axis] /= contacts[i]
+                    exchanged[i, axis] /= contacts[i]
+
+
+def integrate_particles_numba(buffers, start, stop, frames, last_frames):
+    return _integrate_numba(buffers['position_buffer'][start:stop], buffers['previous_position_buffer'][start:stop],
+                            buffers['velocity_buffer'][start:stop], buffers['size_buffer'][start:stop],
+                            buffers['creation_size_buffer'][start:stop], buffers['life_span_buffer'][start:stop],
+                            buffers['creation_life_span_buffer'][start:stop],
+                            buffers['min_size_ratio_buffer'][start:stop], frames, last_frames)
+
+
+def build_particle_quads_numba(positions, previous_positions, sizes, alpha, out):
+    count = len(sizes)
+    if out is None:
+        out = np.empty((count * VERTICES_PER_QUAD, VERTEX_COMPONENTS), dtype=np.float32)
+    _build_quads_numba(positions, previous_positions, sizes, min(alpha, 1.), QUAD_CORNERS, QUAD_TEXCOORDS, out)
+    return out[:count * VERTICES_PER_QUAD]
+
+
+def integrate_particles(buffers, start, stop, delta_t, last_delta_t=None):
+    frames = delta_t * 60
+    last_frames = frames if last_delta_t is None else min(last_delta_t * 60, frames)
+
+    if backend == 'numba':
+        return integrate_particles_numba(buffers, start, stop, frames, last_frames)
+    return integrate_particles_numpy(buffers, start, stop, frames, last_frames)
+
+
+def build_particle_quads(particles, alpha=1., out=None):
+    if backend == 'numba':
+        return build_particle_quads_numba(particles.positions, particles.previous_positions, particles.sizes, alpha, out)
+    return build_particle_quads_numpy(particles.positions, particles.previous_positions, particles.sizes, alpha, out)
+
+
+def find_touching_pairs_numba(positions, radii, cell_keys, cell_starts, cell_counts, table, offset_keys, first,
+                              second):
+    return _find_touching_pairs_numba(positions, radii, cell_keys, cell_starts, cell_counts, table, offset_keys,
+                                      first, second)
+
+
+def resolve_contacts_numba(positions, velocities, radii, first, second):
+    corrections = np.zeros_like(positions)
+    exchanged = np.zeros_like(velocities)
+    _resolve_contacts_numba(positions, velocities, radii, first, second, corrections, exchanged)
+    return corrections, exchanged
+
+
+def resolve_contacts(positions, velocities, radii, first, second):
+    if backend == 'numba':
+        return resolve_contacts_numba(positions, velocities, radii, first, second)
+    return resolve_contacts_numpy(positions, velocities, radii, first, second)
+
+
+def warm_up():
+    # Compiles (or loads from cache) the JIT kernels before the first frame needs them.
+    if backend != 'numba':
+        return
+
+    from ParticleStore import ParticleStore
+
+    particles = ParticleStore(1)
+    particles.add(np.zeros((1, 3)), np.zeros((1, 3)), 1., 1.)
+    particles.update(1 / 60)
+    build_particle_quads(particles, 0.5)
+
+    from SpatialHash import SpatialHash
+
+    first, second = SpatialHash(1.).build(np.zeros((2, 3))).find_pairs(1.)
+    resolve_contacts(np.zeros((2, 3)), np.zeros((2, 3)), np.ones(2), first, second)
+
+
+_requested_backend = os.environ.get('PARTICLE_KERNELS') or BACKENDS[0]
+# Asking for numba without it installed falls back to NumPy instead of failing at import; any other unknown name
+# is an error.
+set_backend('numpy' if _requested_backend == 'numba' and not HAVE_NUMBA else _requested_backend)
@@ -0,0 +1,22 @@
+import numpy as np
+
+VERTEX_COMPONENTS = 5
+VERTICES_PER_QUAD = 4
+
+QUAD_CORNERS = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float32)
+QUAD_TEXCOORDS = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float32)
+
+
+def build_quad_vertices(positions, sizes, out=None):
+    count = len(positions)
+    if out is None:
+        out = np.empty((count * VERTICES_PER_QUAD, VERTEX_COMPONENTS), dtype=np.float32)
+
+    quads = out[:count * VERTICES_PER_QUAD].reshape(count, VERTICES_PER_QUAD, VERTEX_COMPONENTS)
+    half_sizes = (sizes / 2)[:, None]
+    quads[:, :, 0] = positions[:, 0, None] + QUAD_CORNERS[:, 0] * half_sizes
+    quads[:, :, 1] = positions[:, 1, None] + QUAD_CORNERS[:, 1] * half_sizes
+    quads[:, :, 2] = positions[:, 2, None]
+    quads[:, :, 3:] = QUAD_TEXCOORDS
+
+    return out[:count * VERTICES_PER_QUAD]
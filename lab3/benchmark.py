@@ -0,0 +1,107 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from kepler import generate_belt, solve_kepler
+
+DEFAULT_COUNTS = [10000, 100000, 1000000]
+FRAME_DAYS = 1.
+ECCENTRIC_COUNT = 1000000
+MAX_ECCENTRICITY = 0.99
+
+
+def run_benchmark(count, frames, seed):
+    belt = generate_belt(count, seed)
+    positions = np.empty((count, 3), dtype=np.float32)
+
+    solve_time = 0.
+    propagate_time = 0.
+    iterations = 0
+    residual = 0.
+    for frame in range(frames):
+        mean_anomalies = np.mod(belt.mean_anomalies_at(frame * FRAME_DAYS), 2 * np.pi)
+
+        start = time.perf_counter()
+        anomalies, used, _ = solve_kepler(mean_anomalies, belt.eccentricities)
+        solve_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        belt.positions(frame * FRAME_DAYS, positions)
+        propagate_time += time.perf_counter() - start
+
+        iterations = max(iterations, used)
+        residual = max(residual, float(np.abs(anomalies - belt.eccentricities * np.sin(anomalies)
+                                              - mean_anomalies).max()))
+
+    return {
+        'count': count,
+        'frames': frames,
+        'solve_ms': solve_time / frames * 1e3,
+        'propagate_ms': propagate_time / frames * 1e3,
+        'bodies_per_second': count * frames / propagate_time if propagate_time else float('inf'),
+        'newton_iterations': iterations,
+        'max_residual': residual,
+    }
+
+
+def run_eccentric_check(count, seed):
+    # Mean anomalies well outside [0, 2 pi) and eccentricities up to MAX_ECCENTRICITY, where the starting guesses
+    # matter most. Every body must converge within the iteration bound.
+    rng = np.random.default_rng(seed)
+    mean_anomalies = rng.uniform(-2 * np.pi, 4 * np.pi, count)
+    eccentricities = rng.uniform(0, MAX_ECCENTRICITY, count)
+    anomalies, used, unconverged = solve_kepler(mean_anomalies, eccentricities)
+    residuals = anomalies - eccentricities * np.sin(anomalies) - np.mod(mean_anomalies, 2 * np.pi)
+    return {
+        'count': count,
+        'max_eccentricity': MAX_ECCENTRICITY,
+        'newton_iterations': used,
+        'unconverged': len(unconverged),
+        'max_residual': float(np.abs(residuals).max()),
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Headless Keplerian propagation benchmark.')
+    parser.add_argument('--counts', nargs='+', type=int, default=DEFAULT_COUNTS)
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+
+    results = []
+    for count in arguments.counts:
+        results.append(run_benchmark(count, arguments.frames, arguments.seed))
+        print(f'{count}: {results[-1]["propagate_ms"]:.1f} ms/frame', file=sys.stderr)
+
+    eccentric = run_eccentric_check(ECCENTRIC_COUNT, arguments.seed)
+    print(f'eccentric: {eccentric["newton_iterations"]} iterations, {eccentric["unconverged"]} unconverged',
+          file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': arguments.seed,
+        'results': results,
+        'eccentric': eccentric,
+    }
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+
+MESH_VERTEX_COMPONENTS = 8
+INSTANCE_COMPONENTS = 18
+
+# GLSL 1.20 with texture arrays from EXT_texture_array; lighting follows the fixed-function LIGHT0 and material.
+VERTEX_SHADER = '''
+#version 120
+
+attribute vec3 position;
+attribute vec3 normal;
+attribute vec2 texcoord;
+attribute vec4 model0;
+attribute vec4 model1;
+attribute vec4 model2;
+attribute vec4 model3;
+attribute vec2 instance;
+
+varying vec3 eye_position;
+varying vec3 eye_normal;
+varying vec3 layer_texcoord;
+varying float lit;
+
+void main() {
+    mat4 model = mat4(model0, model1, model2, model3);
+    vec4 eye = gl_ModelViewMatrix * (model * vec4(position, 1.0));
+
+    eye_position = eye.xyz;
+    eye_normal = (gl_ModelViewMatrix * (model * vec4(normal, 0.0))).xyz;
+    layer_texcoord = vec3(texcoord, instance.x);
+    lit = instance.y;
+    gl_Position = gl_ProjectionMatrix * eye;
+}
+'''
+
+FRAGMENT_SHADER = '''
+#version 120
+#extension GL_EXT_texture_array : enable
+
+uniform sampler2DArray textures;
+
+varying vec3 eye_position;
+varying vec3 eye_normal;
+varying vec3 layer_texcoord;
+varying float lit;
+
+void main() {
+    vec4 texel = texture2DArray(textures, layer_texcoord);
+    if (lit < 0.5) {
+        gl_FragColor = texel;
+        return;
+    }
+
+    vec3 normal = normalize(eye_normal);
+    vec3 light = normalize(gl_LightSource[0].position.xyz - eye_position);
+    vec3 half_vector = normalize(light - normalize(eye_position));
+    float diffuse = max(dot(normal, light), 0.0);
+    float specular = diffuse > 0.0 ? pow(max(dot(normal, half_vector), 0.0), gl_FrontMaterial.shininess) : 0.0;
+
+    vec4 color = gl_LightModel.ambient * gl_FrontMaterial.ambient
+        + gl_LightSource[0].diffuse * gl_FrontMaterial.diffuse * diffuse
+        + gl_LightSource[0].specular * gl_FrontMaterial.specular * specular;
+    gl_FragColor = vec4(texel.rgb * color.rgb, texel.a);
+}
+'''
+
+MESH_ATTRIBUTES = (
+    ('position', 3, 0),
+    ('normal', 3, 3),
+    ('texcoord', 2, 6),
+)
+INSTANCE_ATTRIBUTES = (
+    ('model0', 4, 0),
+    ('model1', 4, 4),
+    ('model2', 4, 8),
+    ('model3', 4, 12),
+    ('instance', 2, 16),
+)
+
+
+def build_sphere_mesh(slices, stacks):
+    # Same parametrisation and texture mapping as gluSphere: poles on the z axis, t = 1 at +z.
+    rho = np.linspace(0, np.pi, stacks + 1)
+    theta = np.linspace(0, 2 * np.pi, slices + 1)
+    rho, theta = np.meshgrid(rho, theta, indexing='ij')
+
+    vertices = np.zeros((stacks + 1, slices + 1, MESH_VERTEX_COMPONENTS), dtype=np.float32)
+    vertices[:, :, 0] = -np.sin(theta) * np.sin(rho)
+    vertices[:, :, 1] = np.cos(theta) * np.sin(rho)
+    vertices[:, :, 2] = np.cos(rho)
+    vertices[:, :, 3:6] = vertices[:, :, 0:3]
+    vertices[:, :, 6] = np.linspace(0, 1, slices + 1)[None, :]
+    vertices[:, :, 7] = np.linspace(1, 0, stacks + 1)[:, None]
+
+    top = np.arange(stacks)[:, None] * (slices + 1) + np.arange(slices)[None, :]
+    bottom = top + slices + 1
+    indices = np.stack((top, bottom, top + 1, top + 1, bottom, bottom + 1), axis=-1)
+
+    return vertices.reshape(-1, MESH_VERTEX_COMPONENTS), indices.reshape(-1).astype(np.uint32)
+
+
+def build_sphere_meshes(levels):
+    # Every tessellation level shares one vertex and one index buffer; indices already include the vertex base.
+    vertices = []
+    indices = []
+    ranges = []
+    vertex_count = 0
+    index_count = 0
+    for level in levels:
+        level_vertices, level_indices = build_sphere_mesh(level, level)
+        vertices.append(level_vertices)
+        indices.append(level_indices + vertex_count)
+        ranges.append((index_count, len(level_indices)))
+        vertex_count += len(level_vertices)
+        index_count += len(level_indices)
+    return np.concatenate(vertices), np.concatenate(indices).astype(np.uint32), ranges
+
+
+def have_instancing():
+    return bool(glDrawElementsInstanced) and bool(glVertexAttribDivisor) and bool(glTexImage3D)
+
+
+class InstancedSphereRenderer:
+    def __init__(self, levels, texture_array):
+        vertices, indices, self.level_ranges = build_sphere_meshes(levels)
+        self.texture_array = texture_array
+
+        self.program = shaders.compileProgram(shaders.compileShader(VERTEX_SHADER, GL_VERTEX_SHADER),
+                                              shaders.compileShader(FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+        self.texture_location = glGetUniformLocation(self.program, 'textures')
+        self.mesh_locations = [glGetAttribLocation(self.program, name) for name, _, _ in MESH_ATTRIBUTES]
+        self.instance_locations = [glGetAttribLocation(self.program, name) for name, _, _ in INSTANCE_ATTRIBUTES]
+
+        self.vertex_buffer, self.index_buffer, self.instance_buffer = glGenBuffers(3)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        self.instances = np.zeros((0, INSTANCE_COMPONENTS), dtype=np.float32)
+        self.instance_capacity = 0
+
+    def upload_instances(self, matrices, radii, layers, lit):
+        # Instances are expected grouped by level so each level draws a contiguous range.
+        count = len(matrices)
+        if len(self.instances) < count:
+            self.instances = np.zeros((count, INSTANCE_COMPONENTS), dtype=np.float32)
+        instances = self.instances[:count]
+
+        # Matrices arrive column-major; scaling the first three columns sizes the unit sphere.
+        instances[:, 0:16] = matrices.reshape(count, 16)
+        instances[:, 0:12] *= radii[:, None]
+        instances[:, 16] = layers
+        instances[:, 17] = lit
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        if self.instance_capacity < count:
+            self.instance_capacity = count
+            glBufferData(GL_ARRAY_BUFFER, instances.nbytes, instances, GL_STREAM_DRAW)
+        else:
+            glBufferData(GL_ARRAY_BUFFER, self.instance_capacity * INSTANCE_COMPONENTS * 4, None, GL_STREAM_DRAW)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, instances.nbytes, instances)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def bind_attributes(self, locations, attributes, stride, divisor, base=0):
+        for location, (_, size, offset) in zip(locations, attributes):
+            if location < 0:
+                continue
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(base + offset * 4))
+            glVertexAttribDivisor(location, divisor)
+
+    def unbind_attributes(self, locations):
+        for location in locations:
+            if location < 0:
+                continue
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+
+    def upload(self, matrices, radii, layers, lit, levels):
+        order = np.argsort(levels, kind='stable')
+        self.upload_instances(matrices[order], radii[order], layers[order], lit[order])
+        return np.bincount(levels, minlength=len(self.level_ranges))
+
+    def draw(self, matrices, radii, layers, lit, levels):
+        if len(matrices) == 0:
+            return 0
+        return self.draw_uploaded(self.upload(matrices, radii, layers, lit, levels))
+
+    def draw_uploaded(self, level_counts):
+        glUseProgram(self.program)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.texture_array)
+        glUniform1i(self.texture_location, 0)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        self.bind_attributes(self.mesh_locations, MESH_ATTRIBUTES, MESH_VERTEX_COMPONENTS * 4, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+
+        # Without base-instance draws, each level re-points the instance attributes at its range.
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        triangles = 0
+        first = 0
+        for (index_offset, index_count), level_count in zip(self.level_ranges, level_counts):
+            if level_count == 0:
+                continue
+            self.bind_attributes(self.instance_locations, INSTANCE_ATTRIBUTES, INSTANCE_COMPONENTS * 4, 1,
+                                 first * INSTANCE_COMPONENTS * 4)
+            glDrawElementsInstanced(GL_TRIANGLES, index_count, GL_UNSIGNED_INT, ctypes.c_void_p(index_offset * 4),
+                                    int(level_count))
+            triangles += index_count // 3 * int(level_count)
+            first += int(level_count)
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.unbind_attributes(self.mesh_locations + self.instance_locations)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, 0)
+        glUseProgram(0)
+        return triangles
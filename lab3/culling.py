@@ -0,0 +1,48 @@
+from math import tan, radians
+
+import numpy as np
+
+
+def make_frustum_planes(eye, look, up, fov, aspect, near, far):
+    # Inward-facing planes (normal, offset) of the gluLookAt/gluPerspective view volume: a point p is inside
+    # when normal . p + offset >= 0 for all six.
+    forward = look / np.linalg.norm(look)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    upward = np.cross(side, forward)
+
+    half_height = tan(radians(fov) / 2)
+    half_width = half_height * aspect
+
+    normals = np.array([
+        forward,
+        -forward,
+        forward * half_width + side,
+        forward * half_width - side,
+        forward * half_height + upward,
+        forward * half_height - upward,
+    ])
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+
+    offsets = -normals @ eye
+    offsets[0] -= near
+    offsets[1] += far
+    return np.column_stack((normals, offsets))
+
+
+def cull_spheres(planes, centers, radii):
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    return np.all(distances >= -radii[:, None], axis=1)
+
+
+def cull_boxes(planes, centers, half_extents):
+    # A box is outside once even its corner furthest along a plane normal lies behind that plane.
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    reaches = half_extents @ np.abs(planes[:, :3]).T
+    return np.all(distances >= -reaches, axis=1)
+
+
+def get_ring_half_extents(orbit_matrices, radii, thickness=0.):
+    # A circle with unit normal n spans r * sqrt(1 - n_i^2) along each axis i.
+    normals = orbit_matrices[:, 2, :3]
+    return radii[:, None] * np.sqrt(np.maximum(1 - normals ** 2, 0)) + thickness
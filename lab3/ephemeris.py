@@ -0,0 +1,88 @@
+import argparse
+
+import numpy as np
+
+from kepler import OrbitalElements, kepler_periods
+
+
+class EphemerisTable:
+    # Offsets from the parent body in AU, in the parent's frame, sampled every interval days from start.
+    def __init__(self, start, interval, positions):
+        self.start = float(start)
+        self.interval = float(interval)
+        self.positions = np.asarray(positions, dtype=float)
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.npz'):
+            data = np.load(path)
+            return cls(data['start'], data['interval'], data['positions'])
+
+        table = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+        intervals = np.diff(table[:, 0])
+        if len(table) < 2 or not np.allclose(intervals, intervals[0]):
+            raise ValueError(f'{path}: ephemeris needs at least two evenly spaced samples')
+        return cls(table[0, 0], intervals[0], table[:, 1:4])
+
+    def save(self, path):
+        if path.endswith('.npz'):
+            np.savez(path, start=self.start, interval=self.interval, positions=self.positions)
+            return
+
+        days = self.start + np.arange(len(self.positions)) * self.interval
+        np.savetxt(path, np.column_stack((days, self.positions)), delimiter=',', header='day,x,y,z', comments='')
+
+    @property
+    def stop(self):
+        return self.start + (len(self.positions) - 1) * self.interval
+
+    def sample(self, days):
+        # Catmull-Rom through the neighbouring samples; times outside the table clamp to its ends.
+        last = len(self.positions) - 1
+        position = np.clip((np.asarray(days, dtype=float) - self.start) / self.interval, 0, last)
+        index = np.minimum(np.floor(position).astype(int), last - 1)
+        t = (position - index)[..., None]
+
+        p1 = self.positions[index]
+        p2 = self.positions[index + 1]
+        # Past either end the missing neighbour is extrapolated linearly, which keeps the end tangents.
+        p0 = np.where((index > 0)[..., None], self.positions[np.maximum(index - 1, 0)], 2 * p1 - p2)
+        p3 = np.where((index + 2 <= last)[..., None], self.positions[np.minimum(index + 2, last)], 2 * p2 - p1)
+        return 0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t ** 2
+                      + (3 * p1 - p0 - 3 * p2 + p3) * t ** 3)
+
+
+def tabulate_orbit(elements, start, stop, interval):
+    days = np.arange(start, stop + interval / 2, interval)
+    positions = np.stack([elements.positions(day) for day in days], axis=1)
+    return [EphemerisTable(start, interval, body_positions) for body_positions in positions]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Tabulate a Keplerian orbit as an ephemeris table.')
+    parser.add_argument('output', help='.csv or .npz file to write')
+    parser.add_argument('--semi-major-axis', type=float, required=True, help='AU')
+    parser.add_argument('--eccentricity', type=float, default=0.)
+    parser.add_argument('--inclination', type=float, default=0., help='degrees')
+    parser.add_argument('--ascending-node', type=float, default=0., help='degrees')
+    parser.add_argument('--periapsis-argument', type=float, default=0., help='degrees')
+    parser.add_argument('--mean-anomaly', type=float, default=0., help='degrees at day 0')
+    parser.add_argument('--period', type=float, help='days; defaults to Kepler\'s third law around the sun')
+    parser.add_argument('--start', type=float, default=0., help='first day')
+    parser.add_argument('--stop', type=float, default=36525., help='last day')
+    parser.add_argument('--interval', type=float, default=1., help='days between samples')
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    period = arguments.period if arguments.period else kepler_periods(arguments.semi_major_axis)
+    elements = OrbitalElements([arguments.semi_major_axis], [arguments.eccentricity], [arguments.inclination],
+                               [arguments.ascending_node], [arguments.periapsis_argument], [arguments.mean_anomaly],
+                               [period])
+    table, = tabulate_orbit(elements, arguments.start, arguments.stop, arguments.interval)
+    table.save(arguments.output)
+
+
+if __name__ == '__main__':
+    main()
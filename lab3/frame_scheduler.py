@@ -0,0 +1,24 @@
+from time import perf_counter
+
+DEFAULT_TARGET_FPS = 60.
+
+
+class FrameScheduler:
+    # Frame deadlines on a fixed grid at the target rate, so pacing does not drift with how long frames take.
+    # A target of zero or less means frames are started as soon as they are requested.
+    def __init__(self, target_fps=DEFAULT_TARGET_FPS):
+        self.interval = 1 / target_fps if target_fps > 0 else 0.
+        self.next_frame = None
+
+    def get_delay(self, now=None):
+        if self.next_frame is None:
+            return 0.
+        now = perf_counter() if now is None else now
+        return max(self.next_frame - now, 0.)
+
+    def start_frame(self, now=None):
+        now = perf_counter() if now is None else now
+        if self.next_frame is None or now - self.next_frame > self.interval:
+            # After idling or a long stall the grid restarts instead of rushing to catch up on missed frames.
+            self.next_frame = now
+        self.next_frame += self.interval
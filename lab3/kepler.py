@@ -0,0 +1,115 @@
+import numpy as np
+
+EARTH_YEAR = 365.256363004
+NEWTON_ITERATIONS = 12
+NEWTON_TOLERANCE = 1e-10
+HIGH_ECCENTRICITY = 0.8
+
+
+def solve_kepler(mean_anomalies, eccentricities, iterations=NEWTON_ITERATIONS, tolerance=NEWTON_TOLERANCE):
+    # Solves E - e sin E = M for the eccentric anomaly E; returns (E, iterations used, indices of the bodies that
+    # did not converge). Their anomalies are NaN rather than whatever the last step left behind.
+    # The starting guesses and the iteration bound only hold for M in [0, 2 pi), so M is wrapped into it first.
+    mean_anomalies = np.mod(np.asarray(mean_anomalies, dtype=float).reshape(-1), 2 * np.pi)
+    eccentricities = np.broadcast_to(np.asarray(eccentricities, dtype=float), mean_anomalies.shape)
+
+    anomalies = mean_anomalies + eccentricities * np.sin(mean_anomalies)
+    # Near-parabolic orbits converge from pi instead of overshooting around periapsis.
+    np.copyto(anomalies, np.pi, where=eccentricities > HIGH_ECCENTRICITY)
+
+    # Most bodies converge in a few steps; once they are the majority, only the rest keep iterating.
+    active = None
+    unconverged = np.zeros(0, dtype=np.intp)
+    active_means, active_eccentricities, active_anomalies = mean_anomalies, eccentricities, anomalies
+    for iteration in range(1, iterations + 1):
+        steps = active_anomalies - active_eccentricities * np.sin(active_anomalies) - active_means
+        steps /= 1 - active_eccentricities * np.cos(active_anomalies)
+        active_anomalies -= steps
+        if active is not None:
+            anomalies[active] = active_anomalies
+
+        moving = np.abs(steps) >= tolerance
+        if not moving.any():
+            break
+        if iteration == iterations:
+            unconverged = np.flatnonzero(moving) if active is None else active[moving]
+            anomalies[unconverged] = np.nan
+            break
+        if np.count_nonzero(moving) < len(moving) // 2:
+            active = np.flatnonzero(moving) if active is None else active[moving]
+            active_means = mean_anomalies[active]
+            active_eccentricities = eccentricities[active]
+            active_anomalies = anomalies[active]
+    return anomalies, iteration, unconverged
+
+
+class OrbitalElements:
+    # Angles in degrees, periods in days; the reference plane is x-y, matching the scene.
+    def __init__(self, semi_major_axes, eccentricities, inclinations, ascending_nodes, periapsis_arguments,
+                 mean_anomalies, periods):
+        self.semi_major_axes = np.asarray(semi_major_axes, dtype=float)
+        self.eccentricities = np.asarray(eccentricities, dtype=float)
+        self.inclinations = np.asarray(inclinations, dtype=float)
+        self.ascending_nodes = np.asarray(ascending_nodes, dtype=float)
+        self.periapsis_arguments = np.asarray(periapsis_arguments, dtype=float)
+        self.mean_anomalies = np.asarray(mean_anomalies, dtype=float)
+        self.periods = np.asarray(periods, dtype=float)
+
+        # The orientation is constant, so the perifocal basis is built once.
+        node = np.radians(self.ascending_nodes)
+        periapsis = np.radians(self.periapsis_arguments)
+        inclination = np.radians(self.inclinations)
+        cos_node, sin_node = np.cos(node), np.sin(node)
+        cos_periapsis, sin_periapsis = np.cos(periapsis), np.sin(periapsis)
+        cos_inclination, sin_inclination = np.cos(inclination), np.sin(inclination)
+
+        self.periapsis_directions = np.stack((
+            cos_node * cos_periapsis - sin_node * sin_periapsis * cos_inclination,
+            sin_node * cos_periapsis + cos_node * sin_periapsis * cos_inclination,
+            sin_periapsis * sin_inclination,
+        ), axis=1)
+        self.normal_directions = np.stack((
+            -cos_node * sin_periapsis - sin_node * cos_periapsis * cos_inclination,
+            -sin_node * sin_periapsis + cos_node * cos_periapsis * cos_inclination,
+            cos_periapsis * sin_inclination,
+        ), axis=1)
+        self.semi_minor_axes = self.semi_major_axes * np.sqrt(1 - self.eccentricities ** 2)
+
+    def __len__(self):
+        return len(self.semi_major_axes)
+
+    def mean_anomalies_at(self, time):
+        turns = np.fmod(time, self.periods) / self.periods
+        return np.radians(self.mean_anomalies) + 2 * np.pi * turns
+
+    def positions(self, time, out=None):
+        anomalies, _, unconverged = solve_kepler(self.mean_anomalies_at(time), self.eccentricities)
+        if len(unconverged):
+            raise ValueError(f'Kepler\'s equation did not converge at day {time} for {len(unconverged)} bodies, '
+                             f'starting with {unconverged[:10].tolist()}')
+
+        along_periapsis = self.semi_major_axes * (np.cos(anomalies) - self.eccentricities)
+        along_normal = self.semi_minor_axes * np.sin(anomalies)
+
+        if out is None:
+            out = np.empty((len(self), 3))
+        np.multiply(self.periapsis_directions, along_periapsis[:, None], out=out, casting='unsafe')
+        out += self.normal_directions * along_normal[:, None]
+        return out
+
+
+def kepler_periods(semi_major_axes):
+    # Semi-major axes in AU around a solar mass give periods in days.
+    return EARTH_YEAR * np.asarray(semi_major_axes, dtype=float) ** 1.5
+
+
+def generate_belt(count, seed=0, inner_radius=2.1, outer_radius=3.3):
+    rng = np.random.default_rng(seed)
+    semi_major_axes = rng.uniform(inner_radius, outer_radius, count)
+    return OrbitalElements(semi_major_axes,
+                           rng.beta(2, 12, count),
+                           np.abs(rng.normal(0, 8, count)),
+                           rng.uniform(0, 360, count),
+                           rng.uniform(0, 360, count),
+                           rng.uniform(0, 360, count),
+                           kepler_periods(semi_major_axes))
@@ -0,0 +1,43 @@
+from math import tan, radians
+
+import numpy as np
+
+SPHERE_LEVELS = (8, 12, 16, 24, 32, 50)
+ORBIT_LEVELS = (64, 128, 256, 512, 1024)
+# Largest chord error, in pixels, a tessellation level may show before the next one is used.
+MAX_ERROR_PIXELS = 0.5
+# Thinner than this on screen, an orbit torus is indistinguishable from a line loop.
+MIN_TORUS_PIXELS = 1.5
+
+
+def get_focal_pixels(viewport_height, fov):
+    return viewport_height / 2 / tan(radians(fov) / 2)
+
+
+def get_level_limits(levels):
+    # A circle of r pixels cut into n segments deviates by about r * (pi / n)^2 / 2 pixels.
+    return np.array([2 * MAX_ERROR_PIXELS * (level / np.pi) ** 2 for level in levels[:-1]])
+
+
+def get_projected_sizes(centers, sizes, eye, focal_pixels, near=1.):
+    distances = np.maximum(np.linalg.norm(centers - eye, axis=1) - sizes, near)
+    return sizes / distances * focal_pixels
+
+
+def get_ring_distances(orbit_matrices, radii, eye):
+    # Orbit matrices are column-major rigid transforms: the upper 3x3 block holds the transposed rotation.
+    local_eyes = np.einsum('nij,nj->ni', orbit_matrices[:, :3, :3], eye - orbit_matrices[:, 3, :3])
+    return np.hypot(np.hypot(local_eyes[:, 0], local_eyes[:, 1]) - radii, local_eyes[:, 2])
+
+
+def select_levels(projected_sizes, levels):
+    return np.searchsorted(get_level_limits(levels), projected_sizes)
+
+
+def count_sphere_triangles(slices, stacks):
+    return 2 * slices * stacks
+
+
+def count_torus_triangles(sides, rings):
+    return 2 * sides * rings
+
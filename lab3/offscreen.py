@@ -0,0 +1,213 @@
+import ctypes
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels as gl_read_pixels
+from PIL import Image
+
+PIXEL_BUFFER_COUNT = 3
+# Frames queued per encoder thread before the render loop waits for them.
+WRITER_BACKLOG = 4
+# zlib level for PNG frames; the default of 6 is several times slower for a few percent smaller files.
+PNG_COMPRESS_LEVEL = 1
+
+
+def create_egl_context():
+    from OpenGL import EGL
+
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError('eglInitialize failed; try EGL_PLATFORM=surfaceless')
+
+    attributes = (EGL.EGLint * 13)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                   EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+                                   EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                                   EGL.EGL_NONE)
+    config = EGL.EGLConfig()
+    count = EGL.EGLint()
+    if not EGL.eglChooseConfig(display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count)) \
+            or count.value == 0:
+        raise RuntimeError('no EGL config with desktop OpenGL')
+
+    # The scene draws into a framebuffer object, so the window-system surface is only there to make current.
+    surface = EGL.eglCreatePbufferSurface(display, config,
+                                          (EGL.EGLint * 5)(EGL.EGL_WIDTH, 1, EGL.EGL_HEIGHT, 1, EGL.EGL_NONE))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError('eglMakeCurrent failed')
+    return context
+
+
+def create_osmesa_context():
+    from OpenGL import osmesa
+
+    context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+    if not context:
+        raise RuntimeError('OSMesaCreateContextExt failed')
+    # OSMesa always renders to client memory; a 1x1 buffer is enough since the scene uses a framebuffer object.
+    buffer = (ctypes.c_ubyte * 4)()
+    if not osmesa.OSMesaMakeCurrent(context, buffer, GL_UNSIGNED_BYTE, 1, 1):
+        raise RuntimeError('OSMesaMakeCurrent failed')
+    return context, buffer
+
+
+def create_context():
+    # PyOpenGL binds its entry points on first import, so PYOPENGL_PLATFORM must already be set by then.
+    platform = os.environ.get('PYOPENGL_PLATFORM')
+    if platform == 'egl':
+        return create_egl_context()
+    if platform == 'osmesa':
+        return create_osmesa_context()
+    raise RuntimeError(f'headless rendering needs PYOPENGL_PLATFORM=egl or osmesa, not {platform}')
+
+
+def create_renderbuffer(storage, width, height, samples):
+    renderbuffer = glGenRenderbuffers(1)
+    glBindRenderbuffer(GL_RENDERBUFFER, renderbuffer)
+    if samples > 0:
+        glRenderbufferStorageMultisample(GL_RENDERBUFFER, samples, storage, width, height)
+    else:
+        glRenderbufferStorage(GL_RENDERBUFFER, storage, width, height)
+    glBindRenderbuffer(GL_RENDERBUFFER, 0)
+    return renderbuffer
+
+
+def create_framebuffer(color, depth=None):
+    framebuffer = glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, color)
+    if depth is not None:
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, depth)
+    status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+    glBindFramebuffer(GL_FRAMEBUFFER, 0)
+    if status != GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError(f'framebuffer incomplete: 0x{status:x}')
+    return framebuffer
+
+
+class Framebuffer:
+    def __init__(self, width, height, samples=0):
+        self.width = width
+        self.height = height
+        self.samples = samples
+        self.renderbuffers = [create_renderbuffer(GL_RGBA8, width, height, samples),
+                              create_renderbuffer(GL_DEPTH_COMPONENT24, width, height, samples)]
+        self.framebuffer = create_framebuffer(*self.renderbuffers)
+
+        # Multisampled renderbuffers cannot be read directly; they are resolved into a single-sampled one.
+        self.resolved = self.framebuffer
+        if samples > 0:
+            self.renderbuffers.append(create_renderbuffer(GL_RGBA8, width, height, 0))
+            self.resolved = create_framebuffer(self.renderbuffers[-1])
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glViewport(0, 0, self.width, self.height)
+
+    def resolve(self):
+        if self.resolved == self.framebuffer:
+            return
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.framebuffer)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, self.resolved)
+        glBlitFramebuffer(0, 0, self.width, self.height, 0, 0, self.width, self.height,
+                          GL_COLOR_BUFFER_BIT, GL_NEAREST)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+
+    def delete(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        framebuffers = list({self.framebuffer, self.resolved})
+        glDeleteFramebuffers(len(framebuffers), framebuffers)
+        glDeleteRenderbuffers(len(self.renderbuffers), self.renderbuffers)
+
+
+class PixelBufferRing:
+    # glReadPixels into a pack buffer returns at once; a buffer is mapped only after the rest of the ring has
+    # been filled, by which time the copy has long finished and mapping does not stall the pipeline.
+    def __init__(self, width, height, count=PIXEL_BUFFER_COUNT):
+        self.width = width
+        self.height = height
+        self.size = width * height * 4
+        self.buffers = list(glGenBuffers(count)) if count > 1 else [glGenBuffers(1)]
+        self.pending = deque()
+        self.next = 0
+        for buffer in self.buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+    def read(self, framebuffer, frame):
+        # Returns (frame, image) pairs that have become ready; images are top row first.
+        ready = []
+        if len(self.pending) == len(self.buffers):
+            ready.append(self.map(*self.pending.popleft()))
+
+        buffer = self.buffers[self.next]
+        self.next = (self.next + 1) % len(self.buffers)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, framebuffer)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        gl_read_pixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.pending.append((buffer, frame))
+        return ready
+
+    def flush(self):
+        ready = [self.map(*pending) for pending in self.pending]
+        self.pending.clear()
+        return ready
+
+    def map(self, buffer, frame):
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+        address = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        pixels = np.frombuffer((ctypes.c_ubyte * self.size).from_address(address), dtype=np.uint8)
+        image = pixels.reshape(self.height, self.width, 4)[::-1].copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return frame, image
+
+    def delete(self):
+        glDeleteBuffers(len(self.buffers), self.buffers)
+
+
+class ImageSequenceWriter:
+    def __init__(self, pattern, workers=None):
+        self.pattern = pattern
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(workers)
+        self.futures = deque()
+        self.backlog = WRITER_BACKLOG * workers
+
+    def write(self, frame, image):
+        # PNG compression releases the GIL, so encoding overlaps with rendering the next frames.
+        self.futures.append(self.executor.submit(Image.fromarray(image).save, self.pattern % frame,
+                                                 compress_level=PNG_COMPRESS_LEVEL))
+        while len(self.futures) > self.backlog:
+            self.futures.popleft().result()
+
+    def close(self):
+        for future in self.futures:
+            future.result()
+        self.executor.shutdown()
+
+
+class RawWriter:
+    # Packed RGBA frames, top row first, e.g. for ffmpeg -f rawvideo -pix_fmt rgba -s WxH -i -.
+    def __init__(self, path):
+        self.file = sys.stdout.buffer if path == '-' else open(path, 'wb')
+
+    def write(self, frame, image):
+        self.file.write(image.data)
+
+    def close(self):
+        self.file.flush()
+        if self.file is not sys.stdout.buffer:
+            self.file.close()
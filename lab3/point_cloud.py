@@ -0,0 +1,90 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+SPRITE_SIZE = 32
+POINT_SIZE = 3.
+MIN_POINT_SIZE = 1.
+MAX_POINT_SIZE = 6.
+# Sprites shrink as sqrt(1 / (a + b d + c d^2)) with eye distance d.
+DISTANCE_ATTENUATION = (1., 0., 0.0002)
+
+
+def make_sprite_image(size=SPRITE_SIZE):
+    offsets = (np.arange(size) + 0.5) / size * 2 - 1
+    distances = np.hypot(offsets[None, :], offsets[:, None])
+
+    image = np.full((size, size, 4), 255, dtype=np.uint8)
+    image[:, :, 3] = (np.clip(1 - distances, 0, 1) ** 2 * 255).astype(np.uint8)
+    return image
+
+
+def create_sprite_texture():
+    image = make_sprite_image()
+
+    texture_name = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture_name)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, image.shape[1], image.shape[0], 0,
+                 GL_RGBA, GL_UNSIGNED_BYTE, image)
+    glBindTexture(GL_TEXTURE_2D, 0)
+    return texture_name
+
+
+class PointCloudRenderer:
+    def __init__(self, color=(0.85, 0.8, 0.75, 0.6)):
+        self.color = color
+        self.sprite = create_sprite_texture()
+        self.buffer = glGenBuffers(1)
+        self.capacity = 0
+
+    def upload(self, positions):
+        count = len(positions)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        if self.capacity < count:
+            self.capacity = count
+            glBufferData(GL_ARRAY_BUFFER, positions.nbytes, positions, GL_STREAM_DRAW)
+        else:
+            # Orphan the previous frame's storage so the driver does not stall on it.
+            glBufferData(GL_ARRAY_BUFFER, self.capacity * 3 * 4, None, GL_STREAM_DRAW)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, positions.nbytes, positions)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, positions):
+        count = len(positions)
+        if count == 0:
+            return
+
+        self.upload(np.ascontiguousarray(positions, dtype=np.float32))
+        self.draw_uploaded(count)
+
+    def draw_uploaded(self, count):
+        glPushAttrib(GL_ENABLE_BIT | GL_POINT_BIT | GL_TEXTURE_BIT | GL_CURRENT_BIT | GL_DEPTH_BUFFER_BIT)
+        glDisable(GL_LIGHTING)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.sprite)
+        glEnable(GL_POINT_SPRITE)
+        glTexEnvi(GL_POINT_SPRITE, GL_COORD_REPLACE, GL_TRUE)
+        glPointSize(POINT_SIZE)
+        glPointParameterf(GL_POINT_SIZE_MIN, MIN_POINT_SIZE)
+        glPointParameterf(GL_POINT_SIZE_MAX, MAX_POINT_SIZE)
+        glPointParameterfv(GL_POINT_DISTANCE_ATTENUATION, DISTANCE_ATTENUATION)
+        # Sprites are translucent; they are depth tested against the bodies but do not occlude each other.
+        glDepthMask(GL_FALSE)
+        glColor4f(*self.color)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+        glDrawArrays(GL_POINTS, 0, count)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glPopAttrib()
+
+    def delete(self):
+        glDeleteBuffers(1, [self.buffer])
+        glDeleteTextures([self.sprite])
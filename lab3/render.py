@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import sys
+from time import perf_counter
+
+# Must be chosen before the first OpenGL import; osmesa is the alternative when EGL is unavailable.
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import solar_system
+from offscreen import PIXEL_BUFFER_COUNT, Framebuffer, ImageSequenceWriter, PixelBufferRing, RawWriter, \
+    create_context
+from simulation_clock import FRAME_INTERVAL
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Render the solar system headless to an image sequence or raw video.')
+    solar_system.add_scene_arguments(parser)
+    parser.set_defaults(fixed_interval=FRAME_INTERVAL)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--width', type=int, default=solar_system.WINDOW_WIDTH)
+    parser.add_argument('--height', type=int, default=solar_system.WINDOW_HEIGHT)
+    parser.add_argument('--samples', type=int, default=0, help='multisample count, 0 for none')
+    parser.add_argument('--preset', default='1', help='view preset key, as in the interactive window')
+    parser.add_argument('--pixel-buffers', type=int, default=PIXEL_BUFFER_COUNT,
+                        help='frames in flight between rendering and readback')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--output', default='frames/frame_%05d.png',
+                        help='image file pattern, formatted with the frame number')
+    output.add_argument('--raw', help='write packed RGBA frames to this file, or - for stdout')
+    parser.add_argument('--workers', type=int, help='image encoder threads')
+    parser.add_argument('--report', help='write the JSON timing report to this file instead of stderr')
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+
+    create_context()
+    solar_system.g_viewport_width = arguments.width
+    solar_system.g_viewport_height = arguments.height
+    framebuffer = Framebuffer(arguments.width, arguments.height, arguments.samples)
+    framebuffer.bind()
+
+    solar_system.initialize_scene(arguments)
+    solar_system.handle_key(arguments.preset.encode())
+    # A batch render has no reason to show placeholder textures, so everything is loaded up front.
+    with solar_system.g_profiler.stage('texture_upload'):
+        solar_system.g_texture_streamer.finish()
+
+    ring = PixelBufferRing(arguments.width, arguments.height, arguments.pixel_buffers)
+    writer = RawWriter(arguments.raw) if arguments.raw else ImageSequenceWriter(arguments.output, arguments.workers)
+
+    start = perf_counter()
+    last_day = None
+    for frame in range(arguments.frames):
+        solar_system.render()
+        last_day = solar_system.g_clock.time
+        # Resolve and readback take the place of the swap in a window.
+        with solar_system.g_profiler.stage('swap'):
+            framebuffer.resolve()
+            for ready in ring.read(framebuffer.resolved, frame):
+                writer.write(*ready)
+        solar_system.g_profiler.end_frame()
+        solar_system.g_clock.tick()
+    for ready in ring.flush():
+        writer.write(*ready)
+    writer.close()
+    elapsed = perf_counter() - start
+
+    report = {
+        'frames': arguments.frames,
+        'width': arguments.width,
+        'height': arguments.height,
+        'samples': arguments.samples,
+        'seconds': elapsed,
+        'frames_per_second': arguments.frames / elapsed,
+        'renderer': solar_system.glGetString(solar_system.GL_RENDERER).decode(),
+        'first_day': arguments.epoch,
+        'last_day': last_day,
+    }
+    if arguments.report:
+        with open(arguments.report, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2), file=sys.stderr)
+
+    ring.delete()
+    framebuffer.delete()
+    solar_system.g_texture_streamer.close()
+
+
+if __name__ == '__main__':
+    main()
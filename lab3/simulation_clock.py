@@ -0,0 +1,61 @@
+from time import perf_counter
+
+DEFAULT_SCALE = 16.
+FRAME_INTERVAL = 1 / 60
+
+
+class SimulationClock:
+    # Simulated time in days, advanced by wall time times scale, or by a fixed interval per tick for
+    # reproducible frames. Only the simulated offset is accumulated, so precision does not decay with the epoch.
+    def __init__(self, epoch=0., scale=DEFAULT_SCALE, fixed_interval=None):
+        self.epoch = epoch
+        self.scale = scale
+        self.fixed_interval = fixed_interval
+        self.offset = 0.
+        self.paused = False
+        self.frame = 0
+        self.last_tick = None
+
+    @property
+    def time(self):
+        return self.epoch + self.offset
+
+    def tick(self, now=None):
+        if self.fixed_interval is not None:
+            interval = self.fixed_interval
+        else:
+            now = perf_counter() if now is None else now
+            interval = 0. if self.last_tick is None else now - self.last_tick
+            self.last_tick = now
+
+        if not self.paused:
+            self.offset += interval * self.scale
+            self.frame += 1
+        return self.time
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        # Time spent paused is not caught up on resume.
+        self.last_tick = None
+
+    def toggle_pause(self):
+        if self.paused:
+            self.resume()
+        else:
+            self.pause()
+
+    def step(self, count=1):
+        interval = self.fixed_interval if self.fixed_interval is not None else FRAME_INTERVAL
+        self.offset += count * interval * self.scale
+        self.frame += count
+
+    def warp(self, days):
+        self.offset += days
+
+    def reset(self):
+        self.offset = 0.
+        self.frame = 0
+        self.last_tick = None
@@ -1,40 +1,73 @@
+import argparse
+import atexit
+import csv
+import json
+import os
+import sys
 from copy import copy
-from math import sqrt, fmod, sin, cos
-from time import time
+from math import sqrt, sin, cos
 
 import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
-from PIL import Image, ImageOps
 from numpy.linalg import norm
 
-M_PI = 3.14159265358979323846
+from body_renderer import InstancedSphereRenderer, have_instancing
+from culling import cull_boxes, cull_spheres, get_ring_half_extents, make_frustum_planes
+from ephemeris import EphemerisTable
+from frame_scheduler import DEFAULT_TARGET_FPS, FrameScheduler
+from kepler import generate_belt
+from lod import (SPHERE_LEVELS, ORBIT_LEVELS, MIN_TORUS_PIXELS, count_sphere_triangles, count_torus_triangles,
+                 get_focal_pixels, get_projected_sizes, get_ring_distances, select_levels)
+from point_cloud import PointCloudRenderer
+from simulation_clock import SimulationClock
+from texture_cache import CACHE_DIRECTORY
+from texture_streamer import TextureStreamer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from profiler import SESSION_FRAMES, FrameProfiler
 
-MOON_ORBIT_RADIUS_SCALE = 60
-SUN_RADIUS_SCALE = 0.1
+M_PI = 3.14159265358979323846
 
 ORBIT_RADIUS_FACTOR = 10
 
+# Simulated days per second at rotation speed 1.
 BODY_ROTATION_FACTOR = 20
 
-g_body_rotation_speed = 0.8
-
+BODY_ROTATION_SPEED = 0.8
 BODY_ROTATION_SPEED_FACTOR = 1
+TIME_WARP_FACTOR = 10
+
+BODY_ROTATION_PHASE = 0.1
+BODY_ROTATION_PHASE_FACTOR = 0.3
 
-g_body_rotation_phase = 0.1
 g_last_x = -1
 g_last_y = -1
-
-BODY_ROTATION_PHASE_FACTOR = 0.3
+# Latest drag position not yet applied to the camera; motion events between frames collapse into one update.
+g_motion = None
 
 ORBIT_COLOR = 0x3FFFFFFF
 ORBIT_INNER_RADIUS = 0.02
 
-SPHERE_SUBDIVISION_COUNT = 50
 TORUS_SIDE_DIVISION_COUNT = 10
 TORUS_RADIAL_DIVISION_COUNT = 1002
 
+WINDOW_WIDTH = 1200
+WINDOW_HEIGHT = 640
+
+HUD_MARGIN = 8
+HUD_LINE_HEIGHT = 15
+
+FIELD_OF_VIEW = 45
+NEAR_PLANE = 1
+FAR_PLANE = 200
+
+CATALOG_PATH = 'catalog.json'
+MINOR_BODY_TEXTURE = 'moon'
+TEXTURE_ARRAY_SIZE = (1024, 512)
+MILKY_WAY_TEXTURE_PATH = 'texture/milky_way.png'
+
 
 def make_texture_path(path):
     return f'texture/{path}.png'
@@ -43,6 +76,27 @@ def make_texture_path(path):
 TEXTURE_NAME_MILKY_WAY = None
 DISPLAY_LIST_MILKY_WAY = None
 
+g_clock = None
+g_profiler = FrameProfiler('solar_system')
+g_hud_visible = False
+g_scheduler = None
+g_frame_scheduled = False
+g_viewport_width = WINDOW_WIDTH
+g_viewport_height = WINDOW_HEIGHT
+g_sun = None
+g_hierarchy = None
+g_texture_array = None
+g_body_renderer = None
+g_belt = None
+g_belt_scales = None
+g_belt_positions = None
+g_point_renderer = None
+g_texture_streamer = None
+g_sphere_display_lists = {}
+g_orbit_line_lists = []
+g_frame_stats = {'triangles': 0, 'tori': 0, 'line_loops': 0,
+                 'bodies_drawn': 0, 'bodies_culled': 0, 'orbits_drawn': 0, 'orbits_culled': 0}
+
 
 class Orbit:
     def __init__(self, inclination, radius, display_list, period):
@@ -54,9 +108,12 @@ class Orbit:
 
 class Body:
     def __init__(self, texture_path, texture_name, radius, display_list, tilt, z_rotation_inverse, period, orbit,
-                 planets=None):
+                 planets=None, name=None, show_orbit=True, ephemeris=None):
         if planets is None:
             planets = []
+        self.name = name
+        self.show_orbit = show_orbit
+        self.ephemeris = ephemeris
         self.texture_path = texture_path
         self.texture_name = texture_name
         self.radius = radius
@@ -68,32 +125,6 @@ class Body:
         self.planets = planets
 
 
-BODY_MERCURY = Body(make_texture_path("mercury"), 0, 0.3829, 0, 0.034, [], 58.646, Orbit(7.005, 0.387098, 0, 87.9691))
-BODY_VENUS = Body(make_texture_path("venus"), 0, 0.9499, 0, 2.64, [], 243.025, Orbit(3.39458, 0.723332, 0, 224.701))
-BODY_MOON = Body(make_texture_path("moon"), 0, 0.273, 0, 27.321661 * 4, [], 6.687,
-                 Orbit(5.145, 0.00257 * MOON_ORBIT_RADIUS_SCALE, 0, 27.321661))
-BODY_EARTH = Body(make_texture_path("earth"), 0, 1, 0, 23.4392811, [], 1 * 40, Orbit(0.00005, 1, 0, 365.256363004),
-                  [BODY_MOON])
-BODY_MARS = Body(make_texture_path("mars"), 0, 0.5320, 0, 1.025957, [], 25.19 / 24. * 10,
-                 Orbit(1.850, 1.523679, 0, 686.971))
-BODY_JUPITER = Body(make_texture_path("jupiter"), 0, 10.97, 0, 9.925 / 24. * 2, [], 3.13,
-                    Orbit(1.303, 5.20260, 0, 4332.59))
-BODY_SATURN = Body(make_texture_path("saturn"), 0, 9.140, 0, 10.55 / 24. * 2, [], 26.73,
-                   Orbit(2.485240, 9.554909, 0, 10759.22))
-BODY_URANUS = Body(make_texture_path("uranus"), 0, 3.981, 0, 0.71833, [], 17 / 24. * 2,
-                   Orbit(0.773, 19.2184, 0, 30688.5))
-BODY_NEPTUNE = Body(make_texture_path("neptune"), 0, 3.865, 0, 0.6713, [], 16 / 24. * 2,
-                    Orbit(1.767975, 30.110387, 0, 60182))
-BODY_SUN = Body(make_texture_path("sun"), 0, 109 * SUN_RADIUS_SCALE, 0, 0.,
-                np.array([[1, 0, 0, 0],
-                          [0, 1, 0, 0],
-                          [0, 0, 1, 0],
-                          [0, 0, 0, 1]]),
-                50.05, Orbit(0, 0, 0, 0),
-                [BODY_MERCURY,
-                 BODY_VENUS, BODY_EARTH, BODY_MARS, BODY_JUPITER, BODY_SATURN, BODY_URANUS, BODY_NEPTUNE])
-
-
 def transform_body_radius(radius):
     if radius > 1:
         radius = sqrt(sqrt(radius))
@@ -107,8 +138,118 @@ def transform_orbit_radius(radius):
     return radius * ORBIT_RADIUS_FACTOR
 
 
-def get_rotation(period):
-    return (fmod(time(), period) * g_body_rotation_speed + g_body_rotation_phase) / period * 360 * BODY_ROTATION_FACTOR
+def transform_orbit_radii(radii):
+    return np.where(radii > 1, np.sqrt(radii), radii) * ORBIT_RADIUS_FACTOR
+
+
+def read_catalog_row(row):
+    # CSV catalogs flatten the JSON orbit object into inclination, orbit_radius, orbit_radius_scale and orbit_period.
+    entry = {
+        'name': row['name'],
+        'texture': row['texture'],
+        'radius': float(row['radius']),
+        'tilt': float(row['tilt']),
+        'period': float(row['period']),
+        'show_orbit': row.get('show_orbit', '1').strip().lower() in ('1', 'true', 'yes'),
+    }
+    if row.get('radius_scale'):
+        entry['radius_scale'] = float(row['radius_scale'])
+    if row.get('ephemeris'):
+        entry['ephemeris'] = row['ephemeris']
+    if row.get('parent'):
+        entry['parent'] = row['parent']
+        entry['orbit'] = {
+            'inclination': float(row['inclination']),
+            'radius': float(row['orbit_radius']),
+            'period': float(row['orbit_period']),
+        }
+        if row.get('orbit_radius_scale'):
+            entry['orbit']['radius_scale'] = float(row['orbit_radius_scale'])
+    return entry
+
+
+def read_catalog(path):
+    if path.endswith('.csv'):
+        with open(path, newline='') as file:
+            return [read_catalog_row(row) for row in csv.DictReader(file)]
+
+    with open(path) as file:
+        return json.load(file)['bodies']
+
+
+def load_ephemeris(entry):
+    if not entry.get('ephemeris'):
+        return None
+
+    ephemeris = EphemerisTable.load(entry['ephemeris'])
+    ephemeris.positions *= entry.get('orbit', {}).get('radius_scale', 1)
+    return ephemeris
+
+
+def make_catalog_body(entry):
+    orbit = entry.get('orbit', {})
+    return Body(make_texture_path(entry['texture']), 0,
+                transform_body_radius(entry['radius'] * entry.get('radius_scale', 1)), 0,
+                entry['tilt'], np.identity(4), entry['period'],
+                Orbit(orbit.get('inclination', 0),
+                      transform_orbit_radius(orbit.get('radius', 0) * orbit.get('radius_scale', 1)), 0,
+                      orbit.get('period', 0)),
+                name=entry['name'], show_orbit=entry.get('show_orbit', True), ephemeris=load_ephemeris(entry))
+
+
+def load_catalog(paths):
+    # Parents are resolved once every catalog is read, so a body may come before its parent or in another file.
+    entries = [(path, entry) for path in paths for entry in read_catalog(path)]
+    bodies = {}
+    for path, entry in entries:
+        if entry['name'] in bodies:
+            raise ValueError(f'{path}: body {entry["name"]!r} is already in the catalog')
+        bodies[entry['name']] = make_catalog_body(entry)
+
+    roots = []
+    for path, entry in entries:
+        body = bodies[entry['name']]
+        if not entry.get('parent'):
+            roots.append(body.name)
+        elif entry['parent'] in bodies:
+            bodies[entry['parent']].planets.append(body)
+        else:
+            raise ValueError(f'{path}: body {body.name!r} orbits unknown parent {entry["parent"]!r}')
+
+    if len(roots) != 1:
+        raise ValueError(f'catalog needs exactly one body without a parent, found {len(roots)}: {roots}')
+    return bodies[roots[0]]
+
+
+def generate_minor_bodies(root, count, seed=0):
+    rng = np.random.default_rng(seed)
+    orbit_radii = rng.uniform(2.1, 3.3, count)
+    radii = rng.uniform(0.01, 0.05, count)
+    tilts = rng.uniform(0, 30, count)
+    periods = rng.uniform(2, 20, count)
+    inclinations = rng.uniform(0, 20, count)
+
+    for i in range(count):
+        root.planets.append(Body(make_texture_path(MINOR_BODY_TEXTURE), 0, transform_body_radius(radii[i]), 0,
+                                 tilts[i], np.identity(4), periods[i],
+                                 Orbit(inclinations[i], transform_orbit_radius(orbit_radii[i]), 0,
+                                       365.256363004 * orbit_radii[i] ** 1.5),
+                                 name=f'minor-{i}', show_orbit=False))
+
+
+def get_rotations(periods, days):
+    rotations = np.zeros(len(periods))
+    moving = periods != 0
+    rotations[moving] = np.fmod(days, periods[moving]) / periods[moving] * 360
+    return rotations
+
+
+def transform_orbit_offsets(offsets):
+    distances = norm(offsets, axis=1)
+    scales = np.ones(len(offsets))
+    placed = distances > 0
+    scales[placed] = transform_orbit_radii(distances[placed]) / distances[placed]
+    return offsets * scales[:, None]
 
 
 g_eye = np.array([0., 0., 100.])
@@ -159,6 +300,38 @@ def make_rotation_matrix(angle, axis):
     return matrix
 
 
+def make_rotation_matrices(angles, axes):
+    radians = angles / 180 * M_PI
+    s = np.sin(radians)
+    c = np.cos(radians)
+    axes = np.broadcast_to(axes, (len(angles), 3))
+    axes = axes / norm(axes, axis=1)[:, None]
+    x = axes[:, 0]
+    y = axes[:, 1]
+    z = axes[:, 2]
+    matrices = np.zeros((len(angles), 4, 4))
+    matrices[:, 0, 0] = x * x * (1 - c) + c
+    matrices[:, 0, 1] = x * y * (1 - c) - z * s
+    matrices[:, 0, 2] = x * z * (1 - c) + y * s
+    matrices[:, 1, 0] = y * x * (1 - c) + z * s
+    matrices[:, 1, 1] = y * y * (1 - c) + c
+    matrices[:, 1, 2] = y * z * (1 - c) - x * s
+    matrices[:, 2, 0] = x * z * (1 - c) - y * s
+    matrices[:, 2, 1] = y * z * (1 - c) + x * s
+    matrices[:, 2, 2] = z * z * (1 - c) + c
+    matrices[:, 3, 3] = 1
+
+    return matrices
+
+
+def make_translation_matrices(offsets):
+    matrices = np.zeros((len(offsets), 4, 4))
+    matrices[:, [0, 1, 2, 3], [0, 1, 2, 3]] = 1
+    matrices[:, :3, 3] = offsets
+
+    return matrices
+
+
 def multiply_vector_by_matrix(vector, matrix):
     vec = np.copy(vector)
     vec = np.append(vec, 1)
@@ -173,50 +346,112 @@ def add_multiplied_vector(vector, factor, term):
     return vector
 
 
-def multiply_matrix(matrix, term):
-    matrix = matrix.dot(term)
-    return matrix
+class BodyHierarchy:
+    def __init__(self, root):
+        self.bodies = []
+        parents = []
+        depths = []
 
+        def visit(body, parent, depth):
+            index = len(self.bodies)
+            self.bodies.append(body)
+            parents.append(parent)
+            depths.append(depth)
+            for planet in body.planets:
+                visit(planet, index, depth + 1)
 
-def _glut_get_window_aspect():
-    return glutGet(GLUT_WINDOW_WIDTH) / glutGet(GLUT_WINDOW_HEIGHT)
+        visit(root, -1, 0)
 
+        self.parents = np.array(parents)
+        depths = np.array(depths)
+        # Bodies grouped by depth, so every level can be composed with its parents in one batched product.
+        self.levels = [np.flatnonzero(depths == depth) for depth in range(1, depths.max() + 1)]
+        self.orbits = np.flatnonzero((self.parents >= 0) & np.array([body.show_orbit for body in self.bodies]))
+        self.lit = self.parents >= 0
 
-def check_gl_error():
-    gl_error = glGetError()
-    if gl_error:
-        print("draw: %d\n", gl_error)
-        exit(1)
+        self.texture_paths = sorted({body.texture_path for body in self.bodies})
+        layers = {path: layer for layer, path in enumerate(self.texture_paths)}
+        self.texture_layers = np.array([layers[body.texture_path] for body in self.bodies])
+        self.radii = np.array([body.radius for body in self.bodies], dtype=float)
 
+        self.tilts = np.array([body.tilt for body in self.bodies], dtype=float)
+        self.spin_periods = np.array([body.period for body in self.bodies], dtype=float)
+        self.orbit_inclinations = np.array([body.orbit.inclination for body in self.bodies], dtype=float)
+        self.orbit_radii = np.array([body.orbit.radius for body in self.bodies], dtype=float)
+        self.orbit_periods = np.array([body.orbit.period for body in self.bodies], dtype=float)
 
-def load_texture(path):
-    img = Image.open(path)
-    img = ImageOps.flip(img)
+        self.ephemeris_bodies = np.array([index for index, body in enumerate(self.bodies)
+                                          if body.ephemeris is not None], dtype=int)
 
-    img_data = np.array(img.getdata(), np.uint8)
+        self.body_matrices = np.zeros((len(self.bodies), 4, 4))
+        self.orbit_matrices = np.zeros((len(self.bodies), 4, 4))
 
-    texture_name = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture_name)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, img.width, img.height, 0,
-                 GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-    glBindTexture(GL_TEXTURE_2D, 0)
-    return texture_name
+    def update(self, days):
+        count = len(self.bodies)
+        orbit_rotations = get_rotations(self.orbit_periods, days)
+        spin_rotations = get_rotations(self.spin_periods, days)
+
+        inclinations = make_rotation_matrices(self.orbit_inclinations, np.array([0, -1, 0]))
+        offsets = np.zeros((count, 3))
+        offsets[:, 0] = self.orbit_radii
+        orbits = inclinations @ make_rotation_matrices(orbit_rotations, np.array([0, 0, 1])) \
+            @ make_translation_matrices(offsets)
+
+        # Tabulated bodies sit at their interpolated offset from the parent instead of on the circular orbit.
+        if len(self.ephemeris_bodies):
+            tabulated = transform_orbit_offsets(np.array([self.bodies[index].ephemeris.sample(days)
+                                                          for index in self.ephemeris_bodies]))
+            orbits[self.ephemeris_bodies] = make_translation_matrices(tabulated)
+            orbit_rotations[self.ephemeris_bodies] = np.degrees(np.arctan2(tabulated[:, 1], tabulated[:, 0]))
 
+        frames = np.zeros((count, 4, 4))
+        frames[self.parents < 0] = np.identity(4)
+        total_rotations = np.zeros(count)
+        for level in self.levels:
+            parents = self.parents[level]
+            frames[level] = frames[parents] @ orbits[level]
+            total_rotations[level] = total_rotations[parents] + orbit_rotations[level]
 
-def initialize_body_texture(body):
-    body.texture_name = load_texture(body.texture_path)
+        # The tilt axis is the y axis carried through every orbital rotation up the chain.
+        radians = total_rotations / 180 * M_PI
+        axes = np.stack((-np.sin(radians), np.cos(radians), np.zeros(count)), axis=1)
+        spins = make_rotation_matrices(self.tilts, axes) @ make_rotation_matrices(spin_rotations, np.array([0, 0, 1]))
 
-    for planet in body.planets:
-        initialize_body_texture(planet)
-    return body
+        # OpenGL expects column-major matrices.
+        self.body_matrices = np.ascontiguousarray((frames @ spins).transpose(0, 2, 1))
+        orbit_frames = frames[self.parents[self.orbits]] @ inclinations[self.orbits]
+        self.orbit_matrices[self.orbits] = orbit_frames.transpose(0, 2, 1)
 
 
-def initialize_textures():
-    global TEXTURE_NAME_MILKY_WAY
-    TEXTURE_NAME_MILKY_WAY = load_texture(f'texture/milky_way.png')
+def get_viewport_aspect():
+    return g_viewport_width / g_viewport_height
 
-    initialize_body_texture(BODY_SUN)
+
+def get_viewport_height():
+    return g_viewport_height
+
+
+def check_gl_error():
+    gl_error = glGetError()
+    if gl_error:
+        print("draw: %d\n", gl_error)
+        exit(1)
+
+
+def initialize_textures(cache_directory):
+    global TEXTURE_NAME_MILKY_WAY, g_texture_array, g_texture_streamer
+    # Textures start as placeholders and sharpen as the streamer uploads decoded levels between frames.
+    g_texture_streamer = TextureStreamer(cache_directory)
+    TEXTURE_NAME_MILKY_WAY = g_texture_streamer.create_texture(MILKY_WAY_TEXTURE_PATH)
+
+    if have_instancing():
+        g_texture_array = g_texture_streamer.create_texture_array(g_hierarchy.texture_paths, TEXTURE_ARRAY_SIZE)
+        return
+
+    # Bodies sharing a texture share its texture name too.
+    texture_names = {path: g_texture_streamer.create_texture(path) for path in g_hierarchy.texture_paths}
+    for body in g_hierarchy.bodies:
+        body.texture_name = texture_names[body.texture_path]
 
 
 def initialize_milky_way_display_list():
@@ -243,43 +478,86 @@ def initialize_milky_way_display_list():
     glEndList()
 
 
-def initialize_body_display_list(body, quadric):
-    body.display_list = glGenLists(1)
-    glNewList(body.display_list, GL_COMPILE)
-
-    gluQuadricTexture(quadric, GLU_TRUE)
-    glPushAttrib(GL_ENABLE_BIT | GL_TEXTURE_BIT)
-    glEnable(GL_TEXTURE_2D)
-    glBindTexture(GL_TEXTURE_2D, body.texture_name)
-    body.radius = transform_body_radius(body.radius)
-    gluSphere(quadric, body.radius, SPHERE_SUBDIVISION_COUNT, SPHERE_SUBDIVISION_COUNT)
-    glBindTexture(GL_TEXTURE_2D, 0)
-    glPopAttrib()
-
-    glEndList()
-
-    for planet in body.planets:
-        planet.orbit.display_list = glGenLists(1)
-        glNewList(planet.orbit.display_list, GL_COMPILE)
+def initialize_body_display_lists(hierarchy, quadric):
+    # Without instancing, bodies sharing a texture share unit spheres, one per level, scaled at draw time.
+    for texture_name in {body.texture_name for body in hierarchy.bodies}:
+        display_lists = []
+        for level in SPHERE_LEVELS:
+            display_list = glGenLists(1)
+            glNewList(display_list, GL_COMPILE)
+
+            gluQuadricTexture(quadric, GLU_TRUE)
+            glPushAttrib(GL_ENABLE_BIT | GL_TEXTURE_BIT)
+            glEnable(GL_TEXTURE_2D)
+            glBindTexture(GL_TEXTURE_2D, texture_name)
+            gluSphere(quadric, 1, level, level)
+            glBindTexture(GL_TEXTURE_2D, 0)
+            glPopAttrib()
+
+            glEndList()
+            display_lists.append(display_list)
+        g_sphere_display_lists[texture_name] = display_lists
+
+
+def draw_torus(inner_radius, outer_radius, sides, rings):
+    # Same surface as glutSolidTorus, drawn from vertex arrays so it needs no GLUT window.
+    rings_angles = np.linspace(0, 2 * M_PI, rings + 1)[:, None]
+    sides_angles = np.linspace(0, 2 * M_PI, sides + 1)[None, :]
+    normals = np.stack(np.broadcast_arrays(np.cos(rings_angles) * np.cos(sides_angles),
+                                           np.sin(rings_angles) * np.cos(sides_angles),
+                                           np.sin(sides_angles)), axis=-1)
+    vertices = normals * inner_radius
+    vertices[:, :, 0] += np.cos(rings_angles) * outer_radius
+    vertices[:, :, 1] += np.sin(rings_angles) * outer_radius
+
+    first = np.arange(rings)[:, None] * (sides + 1) + np.arange(sides)[None, :]
+    indices = np.stack((first, first + sides + 1, first + sides + 2, first + 1), axis=-1).astype(np.uint32)
+
+    glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glEnableClientState(GL_NORMAL_ARRAY)
+    glVertexPointer(3, GL_DOUBLE, 0, np.ascontiguousarray(vertices.reshape(-1, 3)))
+    glNormalPointer(GL_DOUBLE, 0, np.ascontiguousarray(normals.reshape(-1, 3)))
+    glDrawElements(GL_QUADS, indices.size, GL_UNSIGNED_INT, indices.reshape(-1))
+    glPopClientAttrib()
+
+
+def initialize_orbit_display_lists(hierarchy, quadric):
+    for index in hierarchy.orbits:
+        orbit = hierarchy.bodies[index].orbit
+        orbit.display_list = glGenLists(1)
+        glNewList(orbit.display_list, GL_COMPILE)
 
         gluQuadricTexture(quadric, GLU_FALSE)
         glPushAttrib(GL_CURRENT_BIT)
-
-        planet.orbit.radius = transform_orbit_radius(planet.orbit.radius)
-        glutSolidTorus(ORBIT_INNER_RADIUS,
-                       planet.orbit.radius,
-                       TORUS_SIDE_DIVISION_COUNT, TORUS_RADIAL_DIVISION_COUNT)
+        draw_torus(ORBIT_INNER_RADIUS,
+                   orbit.radius,
+                   TORUS_SIDE_DIVISION_COUNT, TORUS_RADIAL_DIVISION_COUNT)
         glPopAttrib()
 
         glEndList()
 
-        initialize_body_display_list(planet, quadric)
+    # Far orbits are unit circles scaled to their radius at draw time.
+    for level in ORBIT_LEVELS:
+        angles = np.linspace(0, 2 * M_PI, level, endpoint=False)
+        display_list = glGenLists(1)
+        glNewList(display_list, GL_COMPILE)
+
+        glBegin(GL_LINE_LOOP)
+        for angle in angles:
+            glVertex3f(cos(angle), sin(angle), 0)
+        glEnd()
+
+        glEndList()
+        g_orbit_line_lists.append(display_list)
 
 
 def initialize_solar_system_display_lists():
     quadric = gluNewQuadric()
     gluQuadricDrawStyle(quadric, GLU_FILL)
-    initialize_body_display_list(BODY_SUN, quadric)
+    initialize_orbit_display_lists(g_hierarchy, quadric)
+    if g_texture_array is None:
+        initialize_body_display_lists(g_hierarchy, quadric)
     gluDeleteQuadric(quadric)
 
 
@@ -288,9 +566,38 @@ def initialize_display_lists():
     initialize_solar_system_display_lists()
 
 
-def initialize():
-    initialize_textures()
+def initialize_hierarchy(catalog_paths, minor_body_count):
+    global g_sun, g_hierarchy
+    g_sun = load_catalog(catalog_paths)
+    if minor_body_count:
+        generate_minor_bodies(g_sun, minor_body_count)
+    g_hierarchy = BodyHierarchy(g_sun)
+
+
+def initialize_body_renderer():
+    global g_body_renderer
+    if g_texture_array is not None:
+        g_body_renderer = InstancedSphereRenderer(SPHERE_LEVELS, g_texture_array)
+
+
+def initialize_belt(count):
+    global g_belt, g_belt_scales, g_belt_positions, g_point_renderer
+    if not count:
+        return
+
+    # Elements stay in AU; positions are rescaled per body onto the scene's compressed orbit radii.
+    g_belt = generate_belt(count)
+    g_belt_scales = (transform_orbit_radii(g_belt.semi_major_axes) / g_belt.semi_major_axes)[:, None]
+    g_belt_positions = np.empty((count, 3), dtype=np.float32)
+    g_point_renderer = PointCloudRenderer()
+
+
+def initialize(catalog_paths, minor_body_count, belt_count, cache_directory):
+    initialize_hierarchy(catalog_paths, minor_body_count)
+    initialize_textures(cache_directory)
     initialize_display_lists()
+    initialize_body_renderer()
+    initialize_belt(belt_count)
 
 
 def draw_milky_way():
@@ -312,42 +619,120 @@ def draw_milky_way():
     glPopAttrib()
 
 
-def draw_body(body):
-    glPushAttrib(GL_ENABLE_BIT | GL_TRANSFORM_BIT)
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    if body != BODY_SUN:
-        glEnable(GL_LIGHTING)
+def get_frustum_planes():
+    return make_frustum_planes(g_eye, g_look, g_up, FIELD_OF_VIEW, get_viewport_aspect(), NEAR_PLANE, FAR_PLANE)
 
-    axis = np.array([0, 1, 0])
-    axis = multiply_vector_by_matrix(axis, body.z_rotation_inverse)
-    glRotated(body.tilt, axis[0], axis[1], axis[2])
-    glRotated(get_rotation(body.period), 0, 0, 1)
-    glCallList(body.display_list)
 
-    glMatrixMode(GL_MODELVIEW)
-    glPopMatrix()
-    glPopAttrib()
+def cull_orbits(hierarchy, planes):
+    orbits = hierarchy.orbits
+    matrices = hierarchy.orbit_matrices[orbits]
+    half_extents = get_ring_half_extents(matrices, hierarchy.orbit_radii[orbits], ORBIT_INNER_RADIUS)
+    visible = cull_boxes(planes, matrices[:, 3, :3], half_extents)
 
-    for planet in body.planets:
-        glPushAttrib(GL_TRANSFORM_BIT)
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
+    g_frame_stats['orbits_drawn'] = int(np.count_nonzero(visible))
+    g_frame_stats['orbits_culled'] = len(orbits) - g_frame_stats['orbits_drawn']
+    return orbits[visible]
 
-        glRotated(planet.orbit.inclination, 0, -1, 0)
 
-        glCallList(planet.orbit.display_list)
+def cull_bodies(hierarchy, planes):
+    visible = np.flatnonzero(cull_spheres(planes, hierarchy.body_matrices[:, 3, :3], hierarchy.radii))
 
-        rotation = get_rotation(planet.orbit.period)
-        glRotated(rotation, 0, 0, 1)
-        planet.z_rotation_inverse = make_rotation_matrix(rotation, np.array([0, 0, -1]))
-        multiply_matrix(planet.z_rotation_inverse, body.z_rotation_inverse)
-        glTranslated(planet.orbit.radius, 0, 0)
-        draw_body(planet)
+    g_frame_stats['bodies_drawn'] = len(visible)
+    g_frame_stats['bodies_culled'] = len(hierarchy.bodies) - len(visible)
+    return visible
 
-        glMatrixMode(GL_MODELVIEW)
+
+def draw_orbits(hierarchy, orbits, focal_pixels):
+    radii = hierarchy.orbit_radii[orbits]
+    distances = np.maximum(get_ring_distances(hierarchy.orbit_matrices[orbits], radii, g_eye), NEAR_PLANE)
+    # The torus only pays off once its tube is more than a line wide on screen.
+    tube_pixels = ORBIT_INNER_RADIUS / distances * focal_pixels
+    tori = tube_pixels >= MIN_TORUS_PIXELS
+    levels = select_levels(radii / distances * focal_pixels, ORBIT_LEVELS)
+
+    glMatrixMode(GL_MODELVIEW)
+    glPushAttrib(GL_CURRENT_BIT)
+    for index, radius, torus, level, pixels in zip(orbits, radii, tori, levels, tube_pixels):
+        glPushMatrix()
+        glMultMatrixd(hierarchy.orbit_matrices[index])
+        if torus:
+            glColor4f(1, 1, 1, 1)
+            glCallList(hierarchy.bodies[index].orbit.display_list)
+        else:
+            # A one pixel line stands in for a thinner tube, so it is faded by the tube's pixel coverage.
+            glColor4f(1, 1, 1, min(2 * pixels, 1))
+            glScaled(radius, radius, 1)
+            glCallList(g_orbit_line_lists[level])
         glPopMatrix()
-        glPopAttrib()
+    glPopAttrib()
+
+    torus_count = int(np.count_nonzero(tori))
+    g_frame_stats['tori'] = torus_count
+    g_frame_stats['line_loops'] = len(orbits) - torus_count
+    return torus_count * count_torus_triangles(TORUS_SIDE_DIVISION_COUNT, TORUS_RADIAL_DIVISION_COUNT)
+
+
+def draw_bodies(hierarchy):
+    with g_profiler.stage('update'):
+        hierarchy.update(g_clock.time)
+    focal_pixels = get_focal_pixels(get_viewport_height(), FIELD_OF_VIEW)
+
+    with g_profiler.stage('cull'):
+        planes = get_frustum_planes()
+        orbits = cull_orbits(hierarchy, planes)
+    with g_profiler.stage('draw'):
+        triangles = draw_orbits(hierarchy, orbits, focal_pixels)
+
+    with g_profiler.stage('cull'):
+        visible = cull_bodies(hierarchy, planes)
+        matrices = hierarchy.body_matrices[visible]
+        radii = hierarchy.radii[visible]
+        levels = select_levels(get_projected_sizes(matrices[:, 3, :3], radii, g_eye, focal_pixels, NEAR_PLANE),
+                               SPHERE_LEVELS)
+
+    if g_body_renderer is not None:
+        if len(visible):
+            with g_profiler.stage('buffer_build'):
+                level_counts = g_body_renderer.upload(matrices, radii, hierarchy.texture_layers[visible],
+                                                      hierarchy.lit[visible], levels)
+            with g_profiler.stage('draw'):
+                triangles += g_body_renderer.draw_uploaded(level_counts)
+        g_frame_stats['triangles'] = triangles
+        return
+
+    with g_profiler.stage('draw'):
+        triangles += draw_body_display_lists(hierarchy, visible, levels)
+    g_frame_stats['triangles'] = triangles
+
+
+def draw_body_display_lists(hierarchy, visible, levels):
+    triangles = 0
+    glPushAttrib(GL_ENABLE_BIT)
+    for index, level in zip(visible, levels):
+        body = hierarchy.bodies[index]
+        if hierarchy.lit[index]:
+            glEnable(GL_LIGHTING)
+        else:
+            glDisable(GL_LIGHTING)
+
+        glPushMatrix()
+        glMultMatrixd(hierarchy.body_matrices[index])
+        glScaled(body.radius, body.radius, body.radius)
+        glCallList(g_sphere_display_lists[body.texture_name][level])
+        glPopMatrix()
+        triangles += count_sphere_triangles(SPHERE_LEVELS[level], SPHERE_LEVELS[level])
+    glPopAttrib()
+    return triangles
+
+
+def draw_belt():
+    with g_profiler.stage('update'):
+        g_belt.positions(g_clock.time, g_belt_positions)
+        np.multiply(g_belt_positions, g_belt_scales, out=g_belt_positions, casting='unsafe')
+    with g_profiler.stage('buffer_build'):
+        g_point_renderer.upload(g_belt_positions)
+    with g_profiler.stage('draw'):
+        g_point_renderer.draw_uploaded(len(g_belt_positions))
 
 
 def draw_solar_system():
@@ -357,7 +742,7 @@ def draw_solar_system():
     glPushMatrix()
     glLoadIdentity()
 
-    gluPerspective(45, _glut_get_window_aspect(), 1, 200)
+    gluPerspective(FIELD_OF_VIEW, get_viewport_aspect(), NEAR_PLANE, FAR_PLANE)
     glMatrixMode(GL_MODELVIEW)
     glPushMatrix()
     glLoadIdentity()
@@ -370,7 +755,9 @@ def draw_solar_system():
     glEnable(GL_DEPTH_TEST)
 
     glLightfv(GL_LIGHT0, GL_POSITION, [0, 0, 0, 1])
-    draw_body(BODY_SUN)
+    draw_bodies(g_hierarchy)
+    if g_belt is not None:
+        draw_belt()
 
     glMatrixMode(GL_MODELVIEW)
     glPopMatrix()
@@ -380,26 +767,82 @@ def draw_solar_system():
     glPopAttrib()
 
 
-def draw():
+def render():
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-    draw_milky_way()
+    with g_profiler.stage('draw'):
+        draw_milky_way()
     draw_solar_system()
 
-    glutSwapBuffers()
+
+def draw_hud():
+    glPushAttrib(GL_ENABLE_BIT | GL_CURRENT_BIT)
+    glDisable(GL_LIGHTING)
+    glDisable(GL_TEXTURE_2D)
+    glDisable(GL_DEPTH_TEST)
+    glColor4f(1, 1, 1, 1)
+    for row, line in enumerate(reversed(g_profiler.hud_lines)):
+        glWindowPos2i(HUD_MARGIN, HUD_MARGIN + row * HUD_LINE_HEIGHT)
+        for character in line:
+            glutBitmapCharacter(GLUT_BITMAP_8_BY_13, ord(character))
+    glPopAttrib()
+
+
+def draw():
+    render()
+    if g_hud_visible and g_profiler.enabled:
+        draw_hud()
+    with g_profiler.stage('swap'):
+        glutSwapBuffers()
 
 
 def display():
     draw()
     check_gl_error()
+    g_profiler.end_frame()
+
+
+def is_animating():
+    return not g_clock.paused or g_texture_streamer.busy()
+
+
+def request_redraw():
+    global g_frame_scheduled
+    if g_frame_scheduled:
+        return
+    g_frame_scheduled = True
+    # GLUT waits for the timer in its event loop, so the process sleeps between frames instead of spinning.
+    glutTimerFunc(int(g_scheduler.get_delay() * 1000 + 0.5), frame_timer, 0)
+
+
+def frame_timer(value):
+    global g_frame_scheduled
+    g_frame_scheduled = False
+    g_scheduler.start_frame()
+
+    with g_profiler.stage('update'):
+        apply_motion()
+        g_clock.tick()
+    if g_texture_streamer.busy():
+        with g_profiler.stage('texture_upload'):
+            g_texture_streamer.pump()
+    glutPostRedisplay()
+
+    # When paused with a still camera the timer lapses, and the next input event restarts it.
+    if is_animating():
+        request_redraw()
 
 
 def reshape(width, height):
+    global g_viewport_width, g_viewport_height
+    g_viewport_width = width
+    g_viewport_height = max(height, 1)
     glViewport(0, 0, width, height)
+    request_redraw()
 
 
-def keyboard(key, x, y):
-    global g_eye, g_look, g_up, g_body_rotation_phase, g_body_rotation_speed
+def handle_key(key):
+    global g_eye, g_look, g_up, g_hud_visible
     direction_factor = 1
     if key == b'1':
         g_eye = np.array([0., 0., 120.])
@@ -435,14 +878,24 @@ def keyboard(key, x, y):
         g_up = normalize_vector(np.array([3., 0., 24.]))
     elif key == b'-':
         direction_factor = -1
-        g_body_rotation_phase += direction_factor * BODY_ROTATION_PHASE_FACTOR
+        g_clock.warp(direction_factor * BODY_ROTATION_PHASE_FACTOR * BODY_ROTATION_FACTOR)
     elif key == b'+' or key == b'=':
-        g_body_rotation_phase += direction_factor * BODY_ROTATION_PHASE_FACTOR
+        g_clock.warp(direction_factor * BODY_ROTATION_PHASE_FACTOR * BODY_ROTATION_FACTOR)
     elif key == b'[':
         direction_factor = -1
-        g_body_rotation_speed += direction_factor * BODY_ROTATION_SPEED_FACTOR
+        g_clock.scale += direction_factor * BODY_ROTATION_SPEED_FACTOR * BODY_ROTATION_FACTOR
     elif key == b']':
-        g_body_rotation_speed += direction_factor * BODY_ROTATION_SPEED_FACTOR
+        g_clock.scale += direction_factor * BODY_ROTATION_SPEED_FACTOR * BODY_ROTATION_FACTOR
+    elif key == b'{':
+        g_clock.scale /= TIME_WARP_FACTOR
+    elif key == b'}':
+        g_clock.scale *= TIME_WARP_FACTOR
+    elif key == b' ':
+        g_clock.toggle_pause()
+    elif key == b'.':
+        g_clock.step()
+    elif key == b'0':
+        g_clock.reset()
     elif key == b'a' or key == b'A':
         direction_factor = -1
         direction = copy(g_look)
@@ -464,16 +917,34 @@ def keyboard(key, x, y):
         add_multiplied_vector(g_eye, direction_factor * MOVE_FACTOR, g_up)
     elif key == b'p':
         print(f'g_eye = ({g_eye}), g_look = ({g_look}), g_up = ({g_up})')
+    elif key == b'h' or key == b'H':
+        g_hud_visible = not g_hud_visible
+
+
+def keyboard(key, x, y):
+    handle_key(key)
+    request_redraw()
 
 
 def passive_motion(x, y):
     global g_last_x, g_last_y
+    apply_motion()
     g_last_x = x
     g_last_y = y
 
 
 def motion(x, y):
-    global g_last_x, g_last_y, g_up, g_look
+    global g_motion
+    g_motion = (x, y)
+    request_redraw()
+
+
+def apply_motion():
+    global g_last_x, g_last_y, g_up, g_look, g_motion
+    if g_motion is None:
+        return
+    x, y = g_motion
+    g_motion = None
     if g_last_x >= 0 and g_last_y >= 0:
         radius = 16 * LOOK_DISTANCE
 
@@ -505,15 +976,10 @@ def mouse(button, state, x, y):
 
         direction_factor = 1 if button == 3 else -1
         add_multiplied_vector(g_eye, direction_factor * ZOOM_FACTOR, g_look)
+        request_redraw()
 
 
-def main():
-    glutInit()
-
-    glutInitDisplayMode(GLUT_RGBA | GLUT_DOUBLE | GLUT_ALPHA | GLUT_DEPTH | GLUT_MULTISAMPLE)
-    glutInitWindowSize(1200, 640)
-    glutCreateWindow(b"Solar System")
-
+def initialize_gl_state():
     glClearColor(1., 1., 1., 1.)
     glClearDepth(1)
     glDepthFunc(GL_LEQUAL)
@@ -530,7 +996,63 @@ def main():
     glMateriali(GL_FRONT_AND_BACK, GL_SHININESS, 7)
     glEnable(GL_LIGHT0)
 
-    initialize()
+
+def add_scene_arguments(parser):
+    parser.add_argument('--catalog', action='append',
+                        help=f'body catalog (.json or .csv), repeatable; defaults to {CATALOG_PATH}')
+    parser.add_argument('--minor-bodies', type=int, default=0,
+                        help='number of generated minor bodies drawn as spheres')
+    parser.add_argument('--asteroids', type=int, default=0,
+                        help='number of Keplerian asteroids drawn as a point cloud')
+    parser.add_argument('--epoch', type=float, default=BODY_ROTATION_PHASE * BODY_ROTATION_FACTOR,
+                        help='simulated day shown at start')
+    parser.add_argument('--time-scale', type=float, default=BODY_ROTATION_SPEED * BODY_ROTATION_FACTOR,
+                        help='simulated days per second')
+    parser.add_argument('--fixed-interval', type=float,
+                        help='advance by this many seconds per frame instead of wall time, for reproducible frames')
+    parser.add_argument('--target-fps', type=float, default=DEFAULT_TARGET_FPS,
+                        help='frame rate cap while animating; 0 redraws as fast as possible')
+    parser.add_argument('--profile', action='store_true', help='time each frame stage; H toggles the overlay')
+    parser.add_argument('--profile-output', help='write the per-frame stage times to this .csv or .json file on exit')
+    parser.add_argument('--profile-frames', type=int, default=SESSION_FRAMES,
+                        help='most recent frames kept for --profile-output')
+    parser.add_argument('--texture-cache', default=CACHE_DIRECTORY,
+                        help='directory for decoded textures and mipmaps; an empty string disables the cache')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Solar system')
+    add_scene_arguments(parser)
+    return parser.parse_args()
+
+
+def initialize_scene(arguments):
+    global g_clock, g_scheduler, g_profiler, g_hud_visible
+    g_clock = SimulationClock(arguments.epoch, arguments.time_scale, arguments.fixed_interval)
+    g_scheduler = FrameScheduler(arguments.target_fps)
+
+    g_profiler = FrameProfiler('solar_system', arguments.profile or arguments.profile_output is not None,
+                               session_frames=arguments.profile_frames)
+    g_hud_visible = arguments.profile
+    # glutMainLoop never returns, so the session is written when the process exits.
+    if arguments.profile_output:
+        atexit.register(g_profiler.export, arguments.profile_output)
+
+    initialize_gl_state()
+    initialize(arguments.catalog or [CATALOG_PATH], arguments.minor_bodies, arguments.asteroids,
+               arguments.texture_cache)
+
+
+def main():
+    arguments = parse_arguments()
+
+    glutInit()
+
+    glutInitDisplayMode(GLUT_RGBA | GLUT_DOUBLE | GLUT_ALPHA | GLUT_DEPTH | GLUT_MULTISAMPLE)
+    glutInitWindowSize(WINDOW_WIDTH, WINDOW_HEIGHT)
+    glutCreateWindow(b"Solar System")
+
+    initialize_scene(arguments)
 
     glutReshapeFunc(reshape)
     glutKeyboardFunc(keyboard)
@@ -538,7 +1060,7 @@ def main():
     glutMotionFunc(motion)
     glutMouseFunc(mouse)
     glutDisplayFunc(display)
-    glutIdleFunc(display)
+    request_redraw()
 
     glutMainLoop()
 
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+CACHE_DIRECTORY = 'texture/.cache'
+# Bump when the cached layout or decoding changes so stale entries are ignored.
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def decode_image(path, size=None):
+    img = Image.open(path).convert('RGBA')
+    if size is not None and img.size != tuple(size):
+        img = img.resize(size)
+    img = img.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+
+    # The array interface hands PIL's buffer to NumPy without the per-pixel tuples of getdata().
+    return np.asarray(img)
+
+
+def build_mipmaps(image):
+    levels = [image]
+    while image.shape[0] > 1 or image.shape[1] > 1:
+        # 2x2 box filter in 16-bit sums; a dimension already down to one texel is only averaged along the other.
+        texels = image.astype(np.uint16)
+        if texels.shape[0] > 1:
+            texels = texels[0:texels.shape[0] // 2 * 2:2] + texels[1::2]
+        else:
+            texels = texels * 2
+        if texels.shape[1] > 1:
+            texels = texels[:, 0:texels.shape[1] // 2 * 2:2] + texels[:, 1::2]
+        else:
+            texels = texels * 2
+        image = ((texels + 2) >> 2).astype(np.uint8)
+        levels.append(image)
+    return levels
+
+
+def hash_file(path, size=None):
+    digest = hashlib.sha1(f'{CACHE_VERSION}:{size}'.encode())
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_cache(cache_path):
+    try:
+        with open(cache_path + '.json') as file:
+            shapes = json.load(file)['levels']
+        data = np.load(cache_path + '.npy', mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    levels = []
+    offset = 0
+    for shape in shapes:
+        length = int(np.prod(shape))
+        levels.append(data[offset:offset + length].reshape(shape))
+        offset += length
+    return levels if offset == len(data) else None
+
+
+def write_cache(cache_path, levels):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    data = np.concatenate([level.reshape(-1) for level in levels])
+
+    # Written under temporary names and renamed so a concurrent or interrupted start never sees half an entry.
+    np.save(cache_path + '.tmp.npy', data)
+    with open(cache_path + '.tmp.json', 'w') as file:
+        json.dump({'levels': [level.shape for level in levels]}, file)
+    os.replace(cache_path + '.tmp.npy', cache_path + '.npy')
+    os.replace(cache_path + '.tmp.json', cache_path + '.json')
+
+
+def load_image_levels(path, size=None, cache_directory=CACHE_DIRECTORY):
+    if not cache_directory:
+        return build_mipmaps(decode_image(path, size))
+
+    cache_path = os.path.join(cache_directory, hash_file(path, size))
+    levels = read_cache(cache_path)
+    if levels is None:
+        levels = build_mipmaps(decode_image(path, size))
+        write_cache(cache_path, levels)
+    return levels
@@ -0,0 +1,142 @@
+import heapq
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from OpenGL.GL import *
+from PIL import Image
+
+from texture_cache import CACHE_DIRECTORY, load_image_levels
+
+# Bytes uploaded per pump; larger levels are split into row bands so one frame never uploads much more.
+UPLOAD_BUDGET = 2 << 20
+PLACEHOLDER_TEXEL = (96, 96, 96, 255)
+
+
+def get_level_sizes(width, height):
+    sizes = [(width, height)]
+    while width > 1 or height > 1:
+        width = max(width // 2, 1)
+        height = max(height // 2, 1)
+        sizes.append((width, height))
+    return sizes
+
+
+class StreamedTexture:
+    def __init__(self, target, size, layers=1):
+        self.target = target
+        self.name = glGenTextures(1)
+        self.sizes = get_level_sizes(*size)
+        self.layers = layers
+        # Per layer, the finest level uploaded so far; levels arrive coarsest first.
+        self.finest_levels = np.full(layers, len(self.sizes))
+
+        coarsest = len(self.sizes) - 1
+        glBindTexture(target, self.name)
+        glTexParameteri(target, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+        glTexParameteri(target, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        for level, (width, height) in enumerate(self.sizes):
+            if target == GL_TEXTURE_2D_ARRAY:
+                glTexImage3D(target, level, GL_RGBA8, width, height, layers, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+            else:
+                glTexImage2D(target, level, GL_RGBA8, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+
+        # Until real data arrives only the coarsest level, filled with a neutral placeholder, is sampled.
+        glTexParameteri(target, GL_TEXTURE_BASE_LEVEL, coarsest)
+        glTexParameteri(target, GL_TEXTURE_MAX_LEVEL, coarsest)
+        glBindTexture(target, 0)
+
+        width, height = self.sizes[coarsest]
+        for layer in range(layers):
+            self.upload(layer, coarsest, np.full((height, width, 4), PLACEHOLDER_TEXEL, dtype=np.uint8), 0)
+
+    def upload(self, layer, level, rows, first_row):
+        width = self.sizes[level][0]
+        glBindTexture(self.target, self.name)
+        if self.target == GL_TEXTURE_2D_ARRAY:
+            glTexSubImage3D(self.target, level, 0, first_row, layer, width, len(rows), 1,
+                            GL_RGBA, GL_UNSIGNED_BYTE, np.ascontiguousarray(rows))
+        else:
+            glTexSubImage2D(self.target, level, 0, first_row, width, len(rows),
+                            GL_RGBA, GL_UNSIGNED_BYTE, np.ascontiguousarray(rows))
+        glBindTexture(self.target, 0)
+
+    def complete_level(self, layer, level):
+        self.finest_levels[layer] = level
+        # Array layers share a base level, so a level is sampled only once every layer has it.
+        glBindTexture(self.target, self.name)
+        glTexParameteri(self.target, GL_TEXTURE_BASE_LEVEL, min(int(self.finest_levels.max()), len(self.sizes) - 1))
+        glBindTexture(self.target, 0)
+
+
+class TextureStreamer:
+    def __init__(self, cache_directory=CACHE_DIRECTORY, budget=UPLOAD_BUDGET, workers=None):
+        self.cache_directory = cache_directory
+        self.budget = budget
+        self.executor = ThreadPoolExecutor(workers)
+        self.completed = queue.SimpleQueue()
+        # Heap of pending level uploads, coarsest first across all textures so everything sharpens together.
+        self.uploads = []
+        self.serial = 0
+        self.outstanding = 0
+        self.uploaded_bytes = 0
+
+    def create_texture(self, path):
+        # Opening a PNG only reads its header, so the size is known long before the pixels.
+        texture = StreamedTexture(GL_TEXTURE_2D, Image.open(path).size)
+        self.request(texture, 0, path)
+        return texture.name
+
+    def create_texture_array(self, paths, size):
+        texture = StreamedTexture(GL_TEXTURE_2D_ARRAY, size, len(paths))
+        for layer, path in enumerate(paths):
+            self.request(texture, layer, path, size)
+        return texture.name
+
+    def request(self, texture, layer, path, size=None):
+        # PIL releases the GIL while inflating, so decodes on the pool's threads overlap.
+        self.outstanding += 1
+        future = self.executor.submit(load_image_levels, path, size, self.cache_directory)
+        future.add_done_callback(lambda done: self.completed.put((texture, layer, done)))
+
+    def busy(self):
+        return self.outstanding > 0 or len(self.uploads) > 0
+
+    def queue_levels(self, block=False):
+        while self.outstanding > 0 and (block or not self.completed.empty()):
+            texture, layer, future = self.completed.get()
+            self.outstanding -= 1
+            levels = future.result()
+            for level in reversed(range(len(levels))):
+                heapq.heappush(self.uploads, (-level, self.serial, [texture, layer, level, levels[level], 0]))
+                self.serial += 1
+
+    def pump(self, budget=None):
+        self.queue_levels()
+
+        budget = self.budget if budget is None else budget
+        uploaded = 0
+        while self.uploads and (uploaded == 0 or uploaded < budget):
+            upload = self.uploads[0][2]
+            texture, layer, level, image, first_row = upload
+            row_bytes = image.shape[1] * 4
+            stop = min(len(image), first_row + max((budget - uploaded) // row_bytes, 1))
+
+            texture.upload(layer, level, image[first_row:stop], first_row)
+            uploaded += (stop - first_row) * row_bytes
+            if stop == len(image):
+                heapq.heappop(self.uploads)
+                texture.complete_level(layer, level)
+            else:
+                upload[4] = stop
+
+        self.uploaded_bytes += uploaded
+        return uploaded
+
+    def finish(self):
+        # Blocks until every requested texture is fully resident, for batch rendering where no frame may be blurry.
+        self.queue_levels(block=True)
+        return self.pump(float('inf'))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)